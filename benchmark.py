@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+
+"""Time every stage of the drawing pipeline on a grid of graphs.
+
+Works offline, it does neither import main nor twitter.
+
+    python3 benchmark.py [--grid grid.json] [--repeat 3] [--out benchmark.json]
+                         [--baseline baseline.json] [--tolerance 0.25]
+    python3 benchmark.py --compare benchmark.json --baseline baseline.json
+
+The grid is a json object like `grid` below. Every combination of
+generator, N, layout and style is drawn `repeat` times with the same seed;
+combinations whose layout or style the generator does not allow are
+skipped (and printed), graphs with explicit coordinates are drawn once
+per style.
+With a baseline, stages whose median time grew by more than the tolerance
+(and by more than min_seconds) are reported and the exit status is 1.
+"""
+
+import os
+import sys
+import json
+import argparse
+import platform
+import tempfile
+import subprocess
+import statistics
+from datetime import datetime
+
+from graphs import RandomGraph
+from graphs.pipeline import PlotPipeline, reseed
+from graphs.targets import default_targets
+from graphs.metrics import Metrics, registry
+from graphs.layout_cache import layout_cache
+from graphs.blockmodel import blockmodel_cache
+from graphs.threads import available_cores
+
+absdir = os.path.abspath(os.path.dirname(__file__))
+
+# BarnesHut is only allowed for lattices, Blockmodel for lattices and
+# graphs with communities like the planted partition
+grid = dict(generators=["ErdosRenyi", "BarabasiAlbert", "PlantedPartition", "Geometric",
+                        "SqaureLattice"],
+            N=[100, 1000, 5000],
+            layouts=["SFDP", "BarnesHut", "Spectral", "Blockmodel"],
+            styles=["Degree", "Betweenness", "Community"])
+
+# differences of the median below this many seconds are noise
+min_seconds = 0.05
+
+
+def run_once(generator, N, layout, style, seed, folder):
+    """Draw one graph like main does, returns its size and the seconds of
+    every stage, including the retries of a stage, as measured by the
+    metrics registry."""
+    # empty caches, such that every run does the whole work
+    layout_cache.folder = tempfile.mkdtemp(dir=folder)
+    blockmodel_cache.folder = tempfile.mkdtemp(dir=folder)
+    # keep the measurements of the benchmark out of the production metrics
+    Metrics.folder = folder
+    reseed(seed)
+
+    def graphGenerator():
+        return getattr(RandomGraph(seed), "generate" + generator)(N=N)
+
+    pipeline = PlotPipeline(graphGenerator, os.path.join(folder, "bench"), absdir,
+                            seed, style=style, layout=layout)
+    pipeline.optimize = None
+    pipeline.targets = default_targets
+
+    def walls():
+        return {stage: s["wall"] for stage, s in registry.stages.items()}
+
+    before = walls()
+    pipeline.run()
+    times = {stage: wall - before.get(stage, 0.) for stage, wall in walls().items()
+             if stage in pipeline.stages}
+
+    size = dict(nodes=pipeline.G.number_of_nodes(), edges=pipeline.G.number_of_edges(),
+                retries=len(pipeline.retries))
+    return size, times
+
+
+def allowed(generator, N):
+    """The layouts and styles the generator allows."""
+    method = getattr(RandomGraph, "generate" + generator)
+    if hasattr(method, "allowed_layouts") and hasattr(method, "allowed_styles"):
+        return method.allowed_layouts, method.allowed_styles
+    # e.g., the binary tree passes on the details of the balanced tree
+    _, details = method(RandomGraph("benchmark"), N=N)
+    return details["allowed_layouts"], details["allowed_styles"]
+
+
+def combinations(grid):
+    """The combinations of the grid the generators allow, the others are
+    printed, such that a layout or style missing from the results is no
+    surprise."""
+    for generator in grid["generators"]:
+        for N in grid["N"]:
+            allowed_layouts, allowed_styles = allowed(generator, N)
+            if allowed_layouts == ["explicit"]:
+                layouts = ["explicit"]
+            else:
+                layouts = [l for l in grid["layouts"] if l in allowed_layouts]
+                skipped = [l for l in grid["layouts"] if l not in allowed_layouts]
+                if skipped:
+                    print("skip {} N={}, layouts not allowed: {}"
+                          .format(generator, N, ", ".join(skipped)))
+            skipped = [s for s in grid["styles"] if s not in allowed_styles]
+            if skipped:
+                print("skip {} N={}, styles not allowed: {}"
+                      .format(generator, N, ", ".join(skipped)))
+            for layout in layouts:
+                for style in grid["styles"]:
+                    if style in allowed_styles:
+                        yield generator, N, layout, style
+
+
+def benchmark(grid, repeat):
+    results = []
+    with tempfile.TemporaryDirectory() as folder:
+        for generator, N, layout, style in combinations(grid):
+            seed = "benchmark/{}/{}".format(generator, N)
+            entry = dict(generator=generator, N=N, layout=layout, style=style,
+                         seed=seed, times={})
+            try:
+                for _ in range(repeat):
+                    size, times = run_once(generator, N, layout, style, seed, folder)
+                    entry.update(size)
+                    for stage, t in times.items():
+                        entry["times"].setdefault(stage, []).append(t)
+            except Exception as e:
+                entry["error"] = repr(e)
+            entry["median"] = {stage: statistics.median(t)
+                               for stage, t in entry["times"].items()}
+            print("{generator} N={N} {layout} {style}:".format(**entry),
+                  ", ".join("{} {:.3f} s".format(*i) for i in entry["median"].items()),
+                  entry.get("error", ""))
+            results.append(entry)
+    return results
+
+
+def metadata(grid, repeat):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=absdir,
+                                capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    return dict(date=datetime.now().isoformat(), commit=commit,
+                python=platform.python_version(), machine=platform.platform(),
+                cores=available_cores(), grid=grid, repeat=repeat)
+
+
+def key(entry):
+    return entry["generator"], entry["N"], entry["layout"], entry["style"]
+
+
+def compare(results, baseline, tolerance):
+    """Stages slower than in the baseline by more than tolerance (relative)."""
+    base = {key(e): e for e in baseline["results"]}
+    regressions = []
+    for entry in results["results"]:
+        old = base.get(key(entry))
+        if old is None:
+            continue
+        for stage, t in entry["median"].items():
+            t0 = old["median"].get(stage)
+            if t0 is None:
+                continue
+            if t > t0 * (1 + tolerance) and t - t0 > min_seconds:
+                regressions.append((key(entry), stage, t0, t))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--grid", help="json file with the grid to sweep")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--out", default="benchmark.json")
+    parser.add_argument("--compare", help="compare these results instead of running")
+    parser.add_argument("--baseline", help="results to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare) as f:
+            results = json.load(f)
+    else:
+        if args.grid:
+            with open(args.grid) as f:
+                grid = dict(grid, **json.load(f))
+        results = dict(meta=metadata(grid, args.repeat),
+                       results=benchmark(grid, args.repeat))
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=1)
+        print("results written to", args.out)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        for (generator, N, layout, style), stage, t0, t in regressions:
+            print("regression: {} N={} {} {}, {}: {:.3f} s -> {:.3f} s"
+                  .format(generator, N, layout, style, stage, t0, t))
+        if regressions:
+            sys.exit(1)
+        print("no regressions")
@@ -33,6 +33,8 @@ def style(style_list):
             G, details = func(*args, **kwargs)
             details["allowed_styles"] = style_list
             return G, details
+        # readable without generating a graph, e.g., by the benchmark
+        func_wrapper.allowed_styles = style_list
         return func_wrapper
     return style_decorator
 
@@ -45,6 +47,7 @@ def layout(layout_list):
             G, details = func(*args, **kwargs)
             details["allowed_layouts"] = layout_list
             return G, details
+        func_wrapper.allowed_layouts = layout_list
         return func_wrapper
     return layout_decorator
 
@@ -231,7 +234,7 @@ class RandomGraph:
     @synonym("n-ary tree")
     @style(styles_all)
     @layout(["SFDP", "FruchtermanReingold", "ARF", "RadialTree",
-             "TwoPi", "Neato", "Spectral", "dot"])
+             "TwoPi", "Neato", "Spectral", "Dot"])
     def generateBalancedTree(self, N=None, h=None, r=None, **kwargs):
         if h is None:
             h = random.randint(2, 3)
@@ -270,7 +273,7 @@ class RandomGraph:
     @synonym("binomial tree")
     @style(styles_all)
     @layout(["SFDP", "FruchtermanReingold", "ARF", "RadialTree",
-             "TwoPi", "Neato", "Spectral", "dot"])
+             "TwoPi", "Neato", "Spectral", "Dot"])
     def generateBinomialTree(self, N=None, h=None, **kwargs):
         if h is None:
             h = random.randint(2, 9)
@@ -480,6 +483,8 @@ class RandomGraph:
 
         fname = os.path.join(self.folder, "networks/{}.gml".format(files[idx]))
         G = nx.read_gml(fname)
+        # named networks are drawn again and again, see worth_caching()
+        G.graph["network"] = files[idx]
         details = dict(name=label[idx],
                        N=len(G.nodes()),
                        idx=idx,
@@ -538,6 +543,8 @@ class RandomGraph:
 
         fname = os.path.join(self.folder, "networks/{}.gml".format(files[idx]))
         G = nx.read_gml(fname, label='id')
+        # named networks are drawn again and again, see worth_caching()
+        G.graph["network"] = files[idx]
         details = dict(name=label[idx],
                        N=len(G.nodes()),
                        idx=idx,
@@ -580,6 +587,8 @@ class RandomGraph:
 
         fname = os.path.join(self.folder, "networks/{}.edgelist".format(files[idx]))
         G = nx.read_edgelist(fname)
+        # named networks are drawn again and again, see worth_caching()
+        G.graph["network"] = files[idx]
         details = dict(name=label[idx],
                        N=len(G.nodes()),
                        idx=idx,
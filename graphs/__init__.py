@@ -1,3 +1,3 @@
 from .RandomGraph import RandomGraph, synonyms, layouts_all, styles_all
 
-from .visualize import draw_graph, draw_graphtool, draw_blockmodel, RetryableError
+from .visualize import draw_graph, draw_graphtool, draw_blockmodel, draw_vector, RetryableError
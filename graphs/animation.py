@@ -0,0 +1,214 @@
+import random
+import itertools
+import multiprocessing
+from collections import deque
+from subprocess import Popen, PIPE
+
+import numpy as np
+
+from .nx2gt.nx2gt import nx2gt
+from .visualize import gt, GtStyle, Centralities, positions_to_gt, compute_style
+from .visualize import render_graphtool
+from .composite import plan_resolution, png_bytes
+from .surface_pool import surface_pool
+from .pipeline import reseed
+from .threads import budget, limit_threads, init_worker, available_cores
+
+
+class Animation:
+    """Parameters of growth animations."""
+    frames = 48
+    fps = 12
+    # the final frame is shown this many seconds before the animation loops
+    hold = 2
+    size = (1024, 512)
+    # sfdp iterations to adapt the previous layout to the new nodes
+    refine_iterations = 30
+    # quality of the lossy webp encoding
+    quality = 75
+
+
+def growth_sizes(N, frames, start=3):
+    """Number of nodes in every frame, growing geometrically up to N."""
+    start = min(start, N)
+    sizes = np.geomspace(start, N, frames).round().astype(int)
+    return sorted(set(sizes))
+
+
+def prefix_graph(g, n):
+    """Subgraph of g induced by its first n vertices, in the same order."""
+    mask = g.new_vertex_property("bool", vals=np.arange(g.num_vertices()) < n)
+    return gt.Graph(gt.GraphView(g, vfilt=mask), prune=True)
+
+
+def place_new_nodes(g, positions, n):
+    """Initial positions of the vertices n and above of g.
+
+    positions   -- (n, 2) array of the positions of the first n vertices
+
+    Every new node starts close to the mean of its already placed
+    neighbors, nodes without such neighbors close to the center.
+    """
+    N = g.num_vertices()
+    placed = np.zeros((N, 2))
+    placed[:n] = positions
+    edges = g.get_edges()
+    length = np.linalg.norm(placed[edges[:, 0]] - placed[edges[:, 1]], axis=1)
+    old = (edges < n).all(axis=1)
+    K = length[old].mean() if old.any() else 1.
+    center = positions.mean(axis=0)
+
+    for v in range(n, N):
+        neighbors = [int(w) for w in g.vertex(v).all_neighbors() if int(w) < v]
+        if neighbors:
+            anchor = placed[neighbors].mean(axis=0)
+        else:
+            anchor = center
+        angle = random.uniform(0, 2 * np.pi)
+        placed[v] = anchor + 0.5 * K * np.array([np.cos(angle), np.sin(angle)])
+
+    return placed
+
+
+def growth_layouts(g, sizes):
+    """Positions of every frame, each warm-started from the previous one.
+
+    The first frame is laid out from scratch. Later frames keep the
+    positions of the nodes already present, add the new nodes next to their
+    neighbors and run only a few sfdp iterations without coarsening, such
+    that nodes move smoothly from frame to frame.
+
+    Returns a list of the frame graphs and a list of (n, 2) arrays.
+    """
+    graphs = []
+    layouts = []
+    for n in sizes:
+        gn = prefix_graph(g, n)
+        if not layouts:
+            positions = gt.sfdp_layout(gn).get_2d_array([0, 1]).T
+        else:
+            previous = layouts[-1]
+            m = len(previous)
+            init = place_new_nodes(gn, previous, m)
+            pos = gt.sfdp_layout(gn, pos=positions_to_gt(gn, init),
+                                 multilevel=False,
+                                 max_iter=Animation.refine_iterations)
+            positions = pos.get_2d_array([0, 1]).T
+            # keep the old nodes in place on average, sfdp may drift
+            positions += previous.mean(axis=0) - positions[:m].mean(axis=0)
+        graphs.append(gn)
+        layouts.append(positions)
+
+    return graphs, layouts
+
+
+# frames for the render workers of animate, inherited by forking
+_frame_jobs = []
+
+
+def _render_frame(i):
+    g, positions, style, plan, centralities = _frame_jobs[i]
+    pos, style_dict = compute_style(g, positions, style, size=Animation.size,
+                                    plan=plan, centralities=centralities)
+    surface = render_graphtool(g, pos, style_dict)
+    try:
+        return png_bytes(surface)
+    finally:
+        surface_pool.release(surface)
+
+
+def encode_animation(pngs, outfile, fps):
+    """Stream png frames into an animated webp or gif by ffmpeg.
+
+    pngs    -- iterable of encoded frames, consumed one by one
+    outfile -- path of the result, the format follows from the extension
+    """
+    if outfile.endswith(".webp"):
+        codec = ["-c:v", "libwebp_anim", "-quality", str(Animation.quality)]
+    else:
+        codec = []
+    ffmpeg = Popen(["ffmpeg", "-loglevel", "error", "-y",
+                    "-f", "image2pipe", "-framerate", str(fps), "-c:v", "png",
+                    "-i", "-", "-loop", "0", *codec, outfile], stdin=PIPE)
+    try:
+        for png in pngs:
+            ffmpeg.stdin.write(png)
+    finally:
+        ffmpeg.stdin.close()
+        if ffmpeg.wait() != 0:
+            raise RuntimeError("ffmpeg failed to encode " + outfile)
+
+
+def animate(G, basename, style, fmt="webp", seed="animation", workers=None):
+    """Draw the growth of G as animation.
+
+    G           -- networkx graph whose nodes are in the order of their
+                   creation, like the Barabasi-Albert, duplication divergence
+                   or Dorogovtsev-Goltsev-Mendes generators produce them
+    basename    -- path of the output without extension
+    style       -- name of the style of every frame
+    fmt         -- "webp" or "gif"
+    seed        -- seed of the layouts
+    workers     -- number of render processes, one per core if None
+
+    The frames show the subgraphs induced by a growing number of the first
+    nodes. Their layouts are calculated one after the other, since every
+    frame starts from the previous one, but then all frames are rendered in
+    parallel and streamed to the encoder in order, such that no more than a
+    few frames are in memory at once.
+
+    Returns the path of the animation.
+    """
+    global _frame_jobs
+
+    reseed(seed)
+    g = nx2gt(G)
+    limit_threads(budget("layout")[1])
+    sizes = growth_sizes(g.num_vertices(), Animation.frames)
+    graphs, layouts = growth_layouts(g, sizes)
+
+    # one viewport and node size for all frames, otherwise the drawing
+    # would jump and nodes would shrink while the graph grows
+    pos = positions_to_gt(graphs[-1], layouts[-1])
+    node_size = GtStyle.max_node_size(graphs[-1], pos, outsize=(1, 1))
+    pixels, extent = plan_resolution(np.vstack(layouts), node_size, Animation.size)
+    offsets = np.cumsum([0] + [len(p) for p in layouts])
+
+    _frame_jobs = []
+    communities = None
+    for i, (gn, positions) in enumerate(zip(graphs, layouts)):
+        plan = (positions_to_gt(gn, pixels[offsets[i]:offsets[i + 1]]),
+                (extent, extent), node_size * extent)
+        centralities = Centralities(gn, communities=communities)
+        if style == "Community":
+            # every frame continues the communities of the previous one,
+            # otherwise their colors would swap from frame to frame
+            communities = centralities.communities.a.copy()
+        _frame_jobs.append((gn, positions, style, plan, centralities))
+
+    def frames(pool, window):
+        # imap would buffer the rendered frames without limit, if the
+        # encoder is slower than the workers, so at most window frames are
+        # submitted, rendered or waiting at once
+        pending = deque()
+        jobs = iter(range(len(graphs)))
+        png = None
+        while True:
+            for i in itertools.islice(jobs, window - len(pending)):
+                pending.append(pool.apply_async(_render_frame, (i,)))
+            if not pending:
+                break
+            png = pending.popleft().get()
+            yield png
+        # the last frame is repeated, such that the final graph can be seen
+        for _ in range(Animation.hold * Animation.fps):
+            yield png
+
+    outfile = f"{basename}.{fmt}"
+    workers, threads = budget("render", workers or available_cores())
+    with multiprocessing.get_context("fork").Pool(workers, init_worker,
+                                                  (threads,)) as pool:
+        encode_animation(frames(pool, 2 * workers), outfile, Animation.fps)
+    _frame_jobs = []
+
+    return outfile
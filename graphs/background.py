@@ -0,0 +1,124 @@
+import sys
+import atexit
+import threading
+from contextlib import contextmanager
+from subprocess import call
+from concurrent.futures import ThreadPoolExecutor, wait
+
+
+class BackgroundQueue:
+    """Work which may be done after the result was published.
+
+    Jobs are run by at most `workers` threads in the order of submission.
+    Jobs which spend their time in subprocesses or in C code which releases
+    the GIL do not slow down the main thread. Pending jobs are waited for
+    when the interpreter exits. The queue can be paused, to fork while none
+    of its threads holds a lock, long jobs should call checkpoint() between
+    steps.
+
+    workers     -- number of threads
+    max_pending -- jobs submitted by submit_unique() beyond this many
+                   unfinished jobs are dropped, no limit if None
+    """
+    def __init__(self, workers=2, max_pending=None):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.executor = None
+        self.futures = set()
+        # keys of the unfinished jobs of submit_unique()
+        self.keys = set()
+        self.lock = threading.Lock()
+        # number of pauses and of jobs running outside of a checkpoint
+        self.gate = threading.Condition()
+        self.pauses = 0
+        self.running = 0
+
+    def submit(self, fn, *args, **kwargs):
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(self.workers,
+                                               thread_name_prefix="background")
+
+        def job():
+            with self.gate:
+                self.gate.wait_for(lambda: not self.pauses)
+                self.running += 1
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                print("background job failed:", e, file=sys.stderr)
+                raise
+            finally:
+                with self.gate:
+                    self.running -= 1
+                    self.gate.notify_all()
+
+        future = self.executor.submit(job)
+        self.futures.add(future)
+        future.add_done_callback(self._done)
+        return future
+
+    def submit_unique(self, key, fn, *args, **kwargs):
+        """Submit a job, unless a job with the same key is not finished yet
+        or max_pending jobs are. Returns the future or None if dropped."""
+        with self.lock:
+            if key in self.keys:
+                print("background job {} is queued already".format(key))
+                return None
+            if self.max_pending is not None and self.pending() >= self.max_pending:
+                print("background queue full, skip job", key)
+                return None
+            self.keys.add(key)
+
+        def job():
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self.lock:
+                    self.keys.discard(key)
+
+        return self.submit(job)
+
+    def _done(self, future):
+        self.futures.discard(future)
+
+    def checkpoint(self):
+        """Wait here while the queue is paused, call only inside a job."""
+        with self.gate:
+            if not self.pauses:
+                return
+            self.running -= 1
+            self.gate.notify_all()
+            self.gate.wait_for(lambda: not self.pauses)
+            self.running += 1
+
+    @contextmanager
+    def paused(self):
+        """Keep the jobs from running while in this context.
+
+        Waits until every running job finished or reached a checkpoint.
+        """
+        with self.gate:
+            self.pauses += 1
+            self.gate.wait_for(lambda: not self.running)
+        try:
+            yield
+        finally:
+            with self.gate:
+                self.pauses -= 1
+                self.gate.notify_all()
+
+    def pending(self):
+        return len(self.futures)
+
+    def join(self):
+        """Wait until all submitted jobs are finished."""
+        wait(list(self.futures))
+
+
+def optimize_png(path):
+    """Recompress the png at path losslessly with maximal compression."""
+    call(["optipng", "-quiet", "-o7", path])
+
+
+background = BackgroundQueue()
+atexit.register(background.join)
@@ -0,0 +1,123 @@
+import os
+import time
+import atexit
+
+import numpy as np
+
+import graph_tool.all as gt
+
+from .layout_cache import BlockmodelCache, cache_folder, fingerprint
+from .background import BackgroundQueue
+
+
+blockmodel_cache = BlockmodelCache(os.path.join(cache_folder, "blockmodels"))
+
+# refinements take minutes each, they get their own queue, such that they
+# do not delay the optimization of the pngs in the shared background queue
+refinements = BackgroundQueue(workers=1, max_pending=2)
+atexit.register(refinements.join)
+
+
+def blockmodel_key(G):
+    return BlockmodelCache.key(fingerprint(G), "Blockmodel")
+
+
+def sweep_blockmodel(state, budget, patience=5, checkpoint=None):
+    """Improve a nested block state by merge-split sweeps at zero temperature.
+
+    state       -- NestedBlockState to improve, it is modified
+    budget      -- seconds after which the best state found so far is returned
+    patience    -- stop early after this many sweeps without improvement
+    checkpoint  -- function called between the sweeps, e.g. to pause
+
+    Returns the block labels of the best state and its description length.
+    """
+    deadline = time.monotonic() + budget
+    best_entropy = state.entropy()
+    best_bs = [np.array(b) for b in state.get_bs()]
+
+    stale = 0
+    while time.monotonic() < deadline and stale < patience:
+        if checkpoint is not None:
+            checkpoint()
+        state.multiflip_mcmc_sweep(beta=np.inf, niter=10)
+        entropy = state.entropy()
+        if entropy < best_entropy - 1e-8:
+            best_entropy = entropy
+            best_bs = [np.array(b) for b in state.get_bs()]
+            stale = 0
+        else:
+            stale += 1
+
+    return best_bs, best_entropy
+
+
+def refine_blockmodel(g, key, budget):
+    """Continue to improve the cached blockmodel of g for budget seconds."""
+    cached = blockmodel_cache.get(key)
+    if cached is None:
+        return
+    bs, entropy, spent = cached
+
+    bs, new_entropy = sweep_blockmodel(gt.NestedBlockState(g, bs=bs), budget,
+                                       checkpoint=refinements.checkpoint)
+
+    # another process might have stored a better state in the meantime
+    current = blockmodel_cache.get(key)
+    if current is not None:
+        entropy = min(entropy, current[1])
+    if new_entropy < entropy:
+        print("refined blockmodel: {:.1f} -> {:.1f}".format(entropy, new_entropy))
+        blockmodel_cache.put(key, (bs, new_entropy, spent + budget))
+
+
+def refine_later(G, g, budget):
+    """Improve the cached blockmodel of G for budget seconds in the background.
+
+    Only call this in the process which keeps running, a forked process
+    exits without waiting for its queue. At most one refinement per graph
+    is queued.
+    """
+    # the refinement works on its own copy of the graph
+    refinements.submit_unique(blockmodel_key(G), refine_blockmodel, gt.Graph(g),
+                              blockmodel_key(G), budget)
+
+
+def fit_blockmodel(G, g, budget=None):
+    """Fit a nested stochastic blockmodel to g, reusing cached fits.
+
+    G       -- networkx graph, identifies the cache entry
+    g       -- the same graph converted by nx2gt
+    budget  -- seconds of sweeps for a new fit, which start from the cached
+               provisional fit or from a trivial state; None minimizes
+               the description length without a limit
+
+    A cached fit is used, unless it is provisional and the budget is larger
+    than the one it was fitted with, then it is fitted again and the better
+    state is kept.
+
+    Returns a NestedBlockState.
+    """
+    key = blockmodel_key(G)
+    cached = blockmodel_cache.get(key)
+    limit = np.inf if budget is None else budget
+
+    if cached is not None:
+        bs, entropy, spent = cached
+        if spent >= limit:
+            return gt.NestedBlockState(g, bs=bs)
+        print("provisional blockmodel of {:.0f} s, fit again".format(spent))
+
+    if budget is None:
+        state = gt.minimize_nested_blockmodel_dl(g)
+        bs, entropy, spent = state.get_bs(), state.entropy(), np.inf
+    else:
+        start = gt.NestedBlockState(g, bs=cached[0] if cached else None)
+        bs, entropy = sweep_blockmodel(start, budget)
+        spent = budget + (cached[2] if cached else 0.)
+
+    if cached is not None and cached[1] < entropy:
+        bs, entropy = cached[0], cached[1]
+    blockmodel_cache.put(key, (bs, entropy, spent))
+
+    return gt.NestedBlockState(g, bs=bs)
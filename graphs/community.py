@@ -0,0 +1,117 @@
+import time
+
+import numpy as np
+
+
+def adjacency(N, edges):
+    """Compact symmetric adjacency of the graph in CSR form.
+
+    Returns the offsets into the neighbor array (length N + 1) and the
+    neighbor array, self loops are dropped.
+    """
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    edges = edges[edges[:, 0] != edges[:, 1]]
+    src = np.concatenate([edges[:, 0], edges[:, 1]])
+    dst = np.concatenate([edges[:, 1], edges[:, 0]])
+    order = np.argsort(src, kind="stable")
+    offsets = np.zeros(N + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=N), out=offsets[1:])
+    return offsets, dst[order]
+
+
+def label_propagation(N, edges, budget=10., seed=0, max_sweeps=100, tol=1e-3,
+                      initial=None):
+    """Detect communities by (semi-synchronous) label propagation.
+
+    N           -- number of nodes
+    edges       -- (M, 2) array of node indices
+    budget      -- seconds after which the current labels are returned
+    seed        -- seed for the update order and the tie breaking
+    max_sweeps  -- maximal number of sweeps over all nodes
+    tol         -- stop if less than this fraction of the nodes changed
+    initial     -- labels of the first nodes from an earlier call, e.g., for
+                   a subgraph, to continue from
+
+    Every node starts in its own community (or with its initial label) and
+    adopts the label most common among its neighbors, keeping its own label
+    on ties with it and breaking other ties at random. In every sweep the
+    nodes are split randomly into two halves which are updated one after
+    the other, which avoids the oscillations of fully synchronous updates
+    while every half is updated with vectorised operations in O(M).
+
+    Returns an array of community indices, 0 is the largest community.
+    Communities which continue initial labels keep their index, new ones
+    are numbered after them.
+    """
+    deadline = time.monotonic() + budget
+    rng = np.random.RandomState(seed)
+
+    offsets, neighbors = adjacency(N, edges)
+    owner = np.repeat(np.arange(N), np.diff(offsets))
+    labels = np.arange(N)
+    if initial is not None:
+        # initial labels are below len(initial), the other nodes get new ones
+        n = len(initial)
+        labels[:n] = initial
+        kept = np.unique(labels[:n])
+
+    for _ in range(max_sweeps):
+        half = rng.randint(2, size=N).astype(bool)
+        changed = 0
+        for batch in (half, ~half):
+            mask = batch[owner]
+            u = owner[mask]
+            candidate = labels[neighbors[mask]]
+            if len(u) == 0:
+                continue
+
+            # count every (node, label) pair
+            key, count = np.unique(u * N + candidate, return_counts=True)
+            pairs = np.column_stack([key // N, key % N])
+            score = (count
+                     + 0.5 * (pairs[:, 1] == labels[pairs[:, 0]])
+                     + 0.1 * rng.random_sample(len(pairs)))
+            # the best label per node is the last one after sorting by score
+            order = np.lexsort((score, pairs[:, 0]))
+            last = np.flatnonzero(np.diff(np.append(pairs[order, 0], -1)))
+            best = pairs[order[last]]
+
+            changed += np.count_nonzero(labels[best[:, 0]] != best[:, 1])
+            labels[best[:, 0]] = best[:, 1]
+
+        if changed < tol * N or time.monotonic() > deadline:
+            break
+
+    # number the communities by size
+    values, labels, sizes = np.unique(labels, return_inverse=True, return_counts=True)
+    rank = np.empty(len(sizes), dtype=np.int64)
+    if initial is None:
+        rank[np.argsort(-sizes, kind="stable")] = np.arange(len(sizes))
+        return rank[labels.ravel()]
+
+    old = np.isin(values, kept)
+    rank[old] = values[old]
+    new = np.flatnonzero(~old)
+    first = kept.max() + 1 if len(kept) else 0
+    rank[new[np.argsort(-sizes[new], kind="stable")]] = first + np.arange(len(new))
+    return rank[labels.ravel()]
+
+
+def community_colors(labels, saturation=0.65, value=0.9):
+    """Distinct rgba colors for community indices, as an (N, 4) array.
+
+    The hues follow the golden angle, such that the large communities, which
+    have small indices, get clearly different colors.
+    """
+    h = (np.asarray(labels) * 0.618033988749895) % 1. * 6
+    i = np.floor(h).astype(int) % 6
+    f = h - np.floor(h)
+    p = value * (1 - saturation)
+    q = value * (1 - saturation * f)
+    t = value * (1 - saturation * (1 - f))
+    v = np.full_like(f, value)
+    p = np.full_like(f, p)
+    r = np.choose(i, [v, q, p, p, t, v])
+    g = np.choose(i, [t, v, v, q, p, p])
+    b = np.choose(i, [p, p, t, v, v, q])
+    return np.column_stack([r, g, b, np.ones_like(f)])
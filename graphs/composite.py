@@ -0,0 +1,126 @@
+import io
+import math
+
+import numpy as np
+import cairo
+
+from .surface_pool import surface_pool
+
+
+# twitters Android stream has 1.8:1 pictures (2048x1137)
+# but twitter web seems to have 2:1          (2048x1024)
+# it is probably better to crop left/right in android than up/down in web
+canvas_size = (2048, 1024)
+# fraction of the trimmed image added as border on every side
+border = 0.05
+
+
+def surface_array(surface):
+    """View the pixels of an ARGB32 image surface as (height, width) uint32."""
+    surface.flush()
+    rows = np.ndarray(shape=(surface.get_height(), surface.get_stride() // 4),
+                      dtype=np.uint32, buffer=surface.get_data())
+    return rows[:, :surface.get_width()]
+
+
+def pixel_color(surface, x=1, y=1):
+    """Color of a pixel of the surface as an rgba tuple of floats."""
+    argb = int(surface_array(surface)[y, x])
+    a = (argb >> 24 & 0xff) / 255
+    # the surface stores premultiplied alpha
+    r, g, b = ((argb >> shift & 0xff) / 255 / a if a else 0.
+               for shift in (16, 8, 0))
+    return r, g, b, a
+
+
+def trim(surface, x=1, y=1):
+    """Bounding box (x0, y0, x1, y1) of all pixels differing from pixel (x, y)."""
+    pixels = surface_array(surface)
+    mask = pixels != pixels[y, x]
+    rows = np.flatnonzero(mask.any(axis=1))
+    cols = np.flatnonzero(mask.any(axis=0))
+    if len(rows) == 0:
+        return 0, 0, surface.get_width(), surface.get_height()
+    return int(cols[0]), int(rows[0]), int(cols[-1]) + 1, int(rows[-1]) + 1
+
+
+def composite(surface, size=canvas_size):
+    """Place the drawing on surface centered on a canvas of the given size.
+
+    Like the ImageMagick chain this replaces, the drawing is trimmed, gets a
+    border, is rotated by -90 degrees if it is higher than wide, resized to
+    fit and centered on a canvas of its background color. The canvas is
+    taken from surface_pool.
+    """
+    X, Y = size
+    color = pixel_color(surface)
+    x0, y0, x1, y1 = trim(surface)
+
+    w = (x1 - x0) * (1 + 2 * border)
+    h = (y1 - y0) * (1 + 2 * border)
+    rotate = h > w
+    if rotate:
+        w, h = h, w
+    scale = min(X / w, Y / h)
+
+    canvas = surface_pool.acquire((X, Y))
+    cr = cairo.Context(canvas)
+    cr.set_source_rgba(*color)
+    cr.paint()
+
+    cr.translate(X / 2, Y / 2)
+    cr.scale(scale, scale)
+    if rotate:
+        cr.rotate(-math.pi / 2)
+    cr.translate(-(x0 + x1) / 2, -(y0 + y1) / 2)
+
+    cr.set_source_surface(surface, 0, 0)
+    cr.get_source().set_filter(cairo.FILTER_GOOD)
+    cr.rectangle(x0, y0, x1 - x0, y1 - y0)
+    cr.fill()
+
+    return canvas
+
+
+def plan_resolution(positions, node_size=0., size=canvas_size):
+    """Map layout positions to pixel coordinates of the final canvas.
+
+    positions   -- (N, 2) array of node positions in layout coordinates
+    node_size   -- diameter of the largest node relative to the extent of
+                   the drawing (GtStyle.max_node_size for outsize (1, 1))
+    size        -- size of the canvas
+
+    Equivalent to composite(), the drawing is rotated by -90 degrees if it
+    is higher than wide and scaled such that it fits on the canvas with a
+    border, but this is done with the positions before anything is drawn.
+
+    Returns the positions in pixel coordinates and the extent of the drawing
+    in pixels, i.e., the outsize for which the styles calculate node sizes.
+    """
+    X, Y = size
+    positions = np.asarray(positions, dtype=float)
+    lo = positions.min(axis=0)
+    hi = positions.max(axis=0)
+    w, h = hi - lo
+    p = positions - (lo + hi) / 2
+
+    if h > w:
+        # rotate by -90 degrees (y points down)
+        p = np.column_stack([p[:, 1], -p[:, 0]])
+        w, h = h, w
+
+    L = max(w, h) or 1.
+    extent = min(X / (1 + 2 * border) / ((w / L + node_size) or 1.),
+                 Y / (1 + 2 * border) / ((h / L + node_size) or 1.))
+
+    return p * (extent / L) + (X / 2, Y / 2), extent
+
+
+def png_bytes(surface):
+    buf = io.BytesIO()
+    surface.write_to_png(buf)
+    return buf.getvalue()
+
+
+def surface_from_png(data):
+    return cairo.ImageSurface.create_from_png(io.BytesIO(data))
@@ -0,0 +1,301 @@
+import random
+
+import numpy as np
+
+
+class Force:
+    """Parameters of the spring-electrical model (Y. Hu, 2005)."""
+    # natural spring length
+    k = 1.
+    # relative strength of the repulsion
+    C = 0.2
+    # pull towards the center of mass, keeps components together
+    gravity = 0.01
+    # reduction of the step size, if the energy does not decrease
+    cooling = 0.9
+    # stop if the step size in units of k falls below this
+    tol = 1e-3
+    # stop coarsening if the graph is smaller or shrinks by less than this
+    coarsest = 32
+    min_shrink = 0.8
+    # at most this many nodes around a node are calculated exactly
+    near = 32
+    # maximal depth of the quadtree
+    max_depth = 20
+
+
+_offsets = np.array([(a, b) for a in range(-2, 4) for b in range(-2, 4)])
+_neighbors = np.array([(a, b) for a in (-1, 0, 1) for b in (-1, 0, 1)])
+
+
+def _spread(x):
+    """Move the bits of x (< 2**32) to the even bits."""
+    x = (x | (x << 16)) & 0x0000FFFF0000FFFF
+    x = (x | (x << 8)) & 0x00FF00FF00FF00FF
+    x = (x | (x << 4)) & 0x0F0F0F0F0F0F0F0F
+    x = (x | (x << 2)) & 0x3333333333333333
+    return (x | (x << 1)) & 0x5555555555555555
+
+
+def _morton(x, y):
+    """Morton code of the cells (x, y), the cells of a quadtree node are
+    contiguous in the order of these codes on every level."""
+    return (_spread(x) << 1) | _spread(y)
+
+
+def _members(cells, first, count):
+    """Members of every cell in cells, contiguous from first[cell].
+
+    Returns for every member the index into cells and the index of the node.
+    """
+    length = count[cells]
+    row = np.repeat(np.arange(len(cells)), length)
+    offset = np.repeat(first[cells] - np.cumsum(length) + length, length)
+    return row, offset + np.arange(len(row))
+
+
+def _add(force, i, d, weight):
+    f = (weight / np.maximum((d**2).sum(axis=1), 1e-12))[:, None] * d
+    force[:, 0] += np.bincount(i, weights=f[:, 0], minlength=len(force))
+    force[:, 1] += np.bincount(i, weights=f[:, 1], minlength=len(force))
+
+
+def _repulsion(positions, mass):
+    """Repulsive forces with a Barnes-Hut like approximation.
+
+    The nodes are sorted along a Morton curve, such that every cell of the
+    quadtree is a contiguous run of nodes on every level. On every level
+    a cell interacts with the cells which are children of the neighbors of
+    its parent, but not its own neighbors, i.e., the cells which were too
+    close on the level above, but are far enough away on this level
+    (opening angle below ~0.7). The field of those cells is expanded to
+    first order around the center of mass of the cell and evaluated at its
+    nodes, such that a far interaction costs O(1) per pair of cells and not
+    per node. A cell is divided further until at most Force.near nodes are
+    in its neighborhood, those are calculated exactly. Thus dense regions
+    are resolved deeper than sparse ones and outliers, which stretch the
+    root cell, do not crowd the other nodes into a few cells. There are
+    O(log N) levels for well spread nodes, at most Force.max_depth.
+    """
+    N = len(positions)
+    strength = Force.C * Force.k**2
+
+    depth = Force.max_depth
+    lo = positions.min(axis=0)
+    side = (positions.max(axis=0) - lo).max() or 1.
+    xy = np.clip(((positions - lo) / side * (1 << depth)).astype(np.int64),
+                 0, (1 << depth) - 1)
+    code = _morton(xy[:, 0], xy[:, 1])
+    order = np.argsort(code, kind="stable")
+    code, xy, p, mass = code[order], xy[order], positions[order], mass[order]
+
+    force = np.zeros_like(p)
+    active = np.ones(N, dtype=bool)
+    for level in range(1, depth + 1):
+        n = 1 << level
+        c = code >> (2 * (depth - level))
+        first = np.flatnonzero(np.r_[True, c[1:] != c[:-1]])
+        keys = c[first]
+        count = np.diff(np.r_[first, N])
+        m = np.add.reduceat(mass, first)
+        center = np.add.reduceat(mass[:, None] * p, first) / m[:, None]
+        cell_xy = xy[first] >> (depth - level)
+
+        def lookup(x, y):
+            """Index of the occupied cell (x, y) in keys, -1 if empty."""
+            inside = (x >= 0) & (x < n) & (y >= 0) & (y < n)
+            k = _morton(np.clip(x, 0, n - 1), np.clip(y, 0, n - 1))
+            idx = np.minimum(np.searchsorted(keys, k), len(keys) - 1)
+            return np.where(inside & (keys[idx] == k), idx, -1)
+
+        cells = np.flatnonzero(active[first])
+        a = cell_xy[cells]
+        # the 6 x 6 children of the neighbors of the parent, without the
+        # 3 x 3 neighbors of the own cell
+        parent = (a >> 1) << 1
+        x = parent[:, 0, None] + _offsets[:, 0]
+        y = parent[:, 1, None] + _offsets[:, 1]
+        far = (np.abs(x - a[:, 0, None]) > 1) | (np.abs(y - a[:, 1, None]) > 1)
+        other = lookup(x, y)
+        r, o = np.nonzero(far & (other >= 0))
+        if len(r):
+            own, other = cells[r], other[r, o]
+            # field w d / |d|^2 at the center of the own cell and its
+            # derivative w (|d|^2 - 2 d d^T) / |d|^4, which is traceless
+            d = center[own] - center[other]
+            r2 = np.maximum((d**2).sum(axis=1), 1e-12)
+            w = strength * m[other] / r2
+            field = np.empty((len(keys), 4))
+            for col, weights in enumerate([w * d[:, 0], w * d[:, 1],
+                                           w * (1 - 2 * d[:, 0]**2 / r2),
+                                           -2 * w * d[:, 0] * d[:, 1] / r2]):
+                field[:, col] = np.bincount(own, weights=weights, minlength=len(keys))
+            field = np.repeat(field, count, axis=0)
+            delta = p - np.repeat(center, count, axis=0)
+            force[:, 0] += mass * (field[:, 0] + field[:, 2] * delta[:, 0]
+                                   + field[:, 3] * delta[:, 1])
+            force[:, 1] += mass * (field[:, 1] + field[:, 3] * delta[:, 0]
+                                   - field[:, 2] * delta[:, 1])
+
+        # cells with few nodes in their neighborhood are not divided further,
+        # the interactions with these nodes are calculated exactly
+        near = lookup(a[:, 0, None] + _neighbors[:, 0], a[:, 1, None] + _neighbors[:, 1])
+        total = np.where(near >= 0, count[near], 0).sum(axis=1)
+        done = (total <= Force.near) | (level == depth)
+        r, o = np.nonzero(near[done] >= 0)
+        row, i = _members(cells[done][r], first, count)
+        row, j = _members(near[done][r, o][row], first, count)
+        i = i[row]
+        i, j = i[i != j], j[i != j]
+        _add(force, i, p[i] - p[j], strength * mass[i] * mass[j])
+
+        finished = np.zeros(len(keys), dtype=bool)
+        finished[cells[done]] = True
+        active &= ~np.repeat(finished, count)
+        if not active.any():
+            break
+
+    unsorted = np.empty_like(force)
+    unsorted[order] = force
+    return unsorted
+
+
+def _forces(positions, mass, edges):
+    force = _repulsion(positions, mass)
+
+    u, v = edges[:, 0], edges[:, 1]
+    d = positions[v] - positions[u]
+    f = d * (np.sqrt((d**2).sum(axis=1)) / Force.k)[:, None]
+    N = len(positions)
+    for dim in (0, 1):
+        force[:, dim] += np.bincount(u, weights=f[:, dim], minlength=N)
+        force[:, dim] -= np.bincount(v, weights=f[:, dim], minlength=N)
+
+    center = (mass[:, None] * positions).sum(axis=0) / mass.sum()
+    force -= Force.gravity * mass[:, None] * (positions - center) / Force.k
+
+    return force
+
+
+def _relax(positions, mass, edges, iterations, step):
+    """Move the nodes along the forces with an adaptive step size."""
+    energy = np.inf
+    progress = 0
+    for _ in range(iterations):
+        force = _forces(positions, mass, edges)
+        norm = np.sqrt((force**2).sum(axis=1))
+        positions += step * force / np.maximum(norm, 1e-12)[:, None]
+
+        new_energy = (norm**2).sum()
+        if new_energy < energy:
+            progress += 1
+            if progress >= 5:
+                progress = 0
+                step /= Force.cooling
+        else:
+            progress = 0
+            step *= Force.cooling
+        energy = new_energy
+
+        if step < Force.tol * Force.k:
+            break
+
+    return positions
+
+
+def coarsen(N, edges, mass, rng, rounds=5):
+    """Merge the nodes into the clusters of a maximal independent set.
+
+    The set is chosen in rounds (Luby's algorithm): every node of lowest
+    random priority among its neighbors, which are not covered by the set
+    yet, joins it. Every other node is merged into its neighbor of lowest
+    priority in the set, nodes not covered after `rounds` rounds stay
+    alone. Every leaf is merged into the cluster of its neighbor, otherwise
+    a star loses only one leaf per level and the coarsening stops early.
+
+    Returns the cluster of every node, the number of clusters, the edges
+    between the clusters and their masses.
+    """
+    priority = rng.permutation(N)
+    node = np.argsort(priority)
+    # both directions of every edge
+    a, b = np.concatenate([edges, edges[:, ::-1]]).T
+
+    chosen = np.zeros(N, dtype=bool)
+    covered = np.zeros(N, dtype=bool)
+    for _ in range(rounds):
+        free = ~covered
+        lowest = np.where(free, priority, N)
+        both = free[a] & free[b]
+        np.minimum.at(lowest, a[both], priority[b[both]])
+        new = free & (lowest == priority)
+        chosen |= new
+        covered |= new
+        covered[a[new[b]]] = True
+        if covered.all():
+            break
+
+    target = np.where(chosen, priority, N)
+    into = chosen[b]
+    np.minimum.at(target, a[into], priority[b[into]])
+    parent = np.where(target < N, node[np.minimum(target, N - 1)], np.arange(N))
+
+    degree = np.bincount(a, minlength=N)
+    leaf = degree[a] == 1
+    parent[a[leaf]] = parent[b[leaf]]
+
+    roots, cluster = np.unique(parent, return_inverse=True)
+    n = len(roots)
+    coarse = cluster[edges]
+    coarse = coarse[coarse[:, 0] != coarse[:, 1]]
+    coarse.sort(axis=1)
+    coarse = np.unique(coarse, axis=0).reshape(-1, 2)
+
+    return cluster, n, coarse, np.bincount(cluster, weights=mass, minlength=n)
+
+
+def barnes_hut_layout(N, edges, iterations=300, seed=None):
+    """Multilevel force-directed layout with Barnes-Hut repulsion.
+
+    N           -- number of nodes
+    edges       -- (M, 2) array of node indices
+    iterations  -- maximum number of iterations on the coarsest level, finer
+                   levels start from a good layout and need fewer
+    seed        -- seed of the random initial positions and coarsening, if
+                   None it is drawn from `random`, i.e., the request seed
+
+    The graph is coarsened repeatedly, the coarsest graph is laid out and the
+    layout is refined level by level, which avoids the many iterations a
+    single level layout needs to untangle large graphs. Every iteration
+    takes O(N log N).
+
+    Returns an (N, 2) array of positions.
+    """
+    if N == 0:
+        return np.zeros((0, 2))
+    if seed is None:
+        seed = random.getrandbits(32)
+    rng = np.random.RandomState(seed)
+
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    edges = edges[edges[:, 0] != edges[:, 1]]
+
+    hierarchy = []
+    n, mass = N, np.ones(N)
+    while n > Force.coarsest:
+        cluster, m, coarse, coarse_mass = coarsen(n, edges, mass, rng)
+        if m > Force.min_shrink * n:
+            break
+        hierarchy.append((cluster, edges, mass))
+        n, edges, mass = m, coarse, coarse_mass
+
+    positions = rng.uniform(-1, 1, (n, 2)) * np.sqrt(mass.sum()) * Force.k
+    positions = _relax(positions, mass, edges, iterations,
+                       step=0.1 * np.sqrt(mass.sum()) * Force.k)
+
+    for cluster, edges, mass in reversed(hierarchy):
+        positions = positions[cluster] + rng.normal(0, 0.1 * Force.k, (len(cluster), 2))
+        positions = _relax(positions, mass, edges, max(iterations // 10, 10),
+                           step=Force.k)
+
+    return positions
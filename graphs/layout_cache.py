@@ -0,0 +1,162 @@
+import os
+import json
+import zipfile
+import hashlib
+import tempfile
+
+import numpy as np
+
+
+def edge_array(G):
+    """Edges of G as an (M, 2) array of node indices in the order of G.nodes()."""
+    index = {v: i for i, v in enumerate(G.nodes())}
+    return np.array([(index[u], index[v]) for u, v in G.edges()],
+                    dtype=np.int64).reshape(-1, 2)
+
+
+def fingerprint(G):
+    """Fingerprint of the topology of G and the order of its nodes.
+
+    Nodes are identified by their index in G.nodes(), which is also the
+    vertex index after nx2gt, such that cached positions can be used
+    directly. Thus it is not canonical: the same graph with its nodes in
+    another order has another fingerprint. It does not depend on the order
+    of the edges or, for undirected graphs, on the orientation of an edge.
+    """
+    edges = edge_array(G)
+    if not G.is_directed():
+        edges.sort(axis=1)
+    edges = edges[np.lexsort((edges[:, 1], edges[:, 0]))]
+
+    h = hashlib.sha256()
+    h.update("{},{:d},{:d};".format(G.number_of_nodes(), G.is_directed(),
+                                    G.is_multigraph()).encode())
+    h.update(edges.tobytes())
+    return h.hexdigest()
+
+
+class LayoutCache:
+    """Positions of already laid out graphs on disk.
+
+    Every entry is a single file (.npy for positions, subclasses store other
+    values by overriding suffix, save and load), which is written atomically,
+    such that several processes can share one cache directory. The access
+    time of an entry is tracked by its mtime and the least recently used
+    entries are removed if the cache grows beyond max_bytes.
+    """
+    suffix = ".npy"
+
+    def __init__(self, folder, max_bytes=512 * 2**20):
+        self.folder = folder
+        self.max_bytes = max_bytes
+
+    def save(self, f, value):
+        np.save(f, np.asarray(value, dtype=float))
+
+    def load(self, path):
+        return np.load(path)
+
+    @staticmethod
+    def key(fp, layout, **params):
+        """Cache key for the graph with fingerprint fp, laid out by layout."""
+        description = json.dumps(dict(fp=fp, layout=layout, params=params),
+                                 sort_keys=True, default=str)
+        return hashlib.sha256(description.encode()).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.folder, key + self.suffix)
+
+    def get(self, key):
+        try:
+            value = self.load(self.path(key))
+            # mark as recently used
+            os.utime(self.path(key))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile) as e:
+            # e.g., truncated by a full disk, it would fail every time
+            print("discard broken cache entry {}: {!r}".format(key, e))
+            self.discard(key)
+            return None
+        return value
+
+    def put(self, key, value):
+        os.makedirs(self.folder, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.folder, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                self.save(f, value)
+            os.replace(tmp, self.path(key))
+        except:
+            os.remove(tmp)
+            raise
+        self.evict()
+
+    def discard(self, key):
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    def evict(self):
+        entries = []
+        for name in os.listdir(self.folder):
+            if not name.endswith(self.suffix):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.folder, name))
+            except FileNotFoundError:
+                # removed by another process in the meantime
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.folder, name))
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+class BlockmodelCache(LayoutCache):
+    """Fitted nested blockmodels on disk.
+
+    An entry holds the block labels of every level of the hierarchy, the
+    description length of the state and the seconds of sweeps it took, inf
+    for a complete minimization. Entries of a limited budget are
+    provisional, a fit with a larger budget replaces them.
+    """
+    suffix = ".npz"
+
+    def save(self, f, value):
+        bs, entropy, spent = value
+        np.savez(f, *bs, entropy=entropy, spent=spent)
+
+    def load(self, path):
+        with np.load(path) as data:
+            levels = [name for name in data.files if name.startswith("arr_")]
+            bs = [data[f"arr_{i}"] for i in range(len(levels))]
+            # entries from before the budget was stored count as provisional
+            spent = float(data["spent"]) if "spent" in data.files else 0.
+            return bs, float(data["entropy"]), spent
+
+
+def worth_caching(G):
+    """Whether the layout of G is kept in the layout cache.
+
+    Random graphs are rarely drawn twice, only the networks read from
+    graphs/networks/ (marked by G.graph["network"]) and graphs too large to
+    lay out again quickly are cached.
+    """
+    return "network" in G.graph or G.number_of_nodes() >= min_cached_nodes
+
+
+# graphs with fewer nodes are laid out again instead of being cached
+min_cached_nodes = 2000
+
+cache_folder = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))),
+                            "cache")
+layout_cache = LayoutCache(os.path.join(cache_folder, "layouts"))
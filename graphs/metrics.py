@@ -0,0 +1,243 @@
+import os
+import json
+import time
+import resource
+import threading
+import tracemalloc
+from contextlib import contextmanager
+
+
+class Metrics:
+    """Where and how the measurements of the stages are written."""
+    folder = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))),
+                          "metrics")
+    # one json object per line for the start and the end of every stage
+    jsonl = "stages.jsonl"
+    # for the textfile collector of the prometheus node exporter
+    textfile = "agraphaday.prom"
+    # also trace the peak of python allocations, which slows python down
+    tracemalloc = False
+    # upper bounds (seconds) of the buckets of the reply latency histogram
+    latency_buckets = (10, 30, 60, 120, 300, 600, 1800, 3600, float("inf"))
+
+
+def _reset_peak_rss():
+    """Start a new peak of the resident memory, only possible on Linux."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss():
+    """Peak resident memory in bytes."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    # kB on Linux, but bytes on macOS
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _children_cpu():
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+class Registry:
+    """Measurements of this process, written as json lines and as textfile.
+
+    The textfile holds counters since the start of the process, since the
+    mentions daemon runs for days, and which stage is running right now,
+    such that a killed run shows where it was.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stages = {}
+        self.running = {}
+        self.latency = [0] * len(Metrics.latency_buckets)
+        self.latency_sum = 0.
+        self.latency_count = 0
+        # the last split of the cores per stage, see threads.budget()
+        self.threads = {}
+
+    def _append(self, record):
+        os.makedirs(Metrics.folder, exist_ok=True)
+        with open(os.path.join(Metrics.folder, Metrics.jsonl), "a") as f:
+            f.write(json.dumps(record, default=str) + "\n")
+
+    def start(self, stage):
+        with self.lock:
+            self.running[stage] = time.time()
+            self._append(dict(event="start", stage=stage, time=self.running[stage],
+                              pid=os.getpid()))
+            self._write_textfile()
+
+    def end(self, record):
+        with self.lock:
+            self.running.pop(record["stage"], None)
+            s = self.stages.setdefault(record["stage"], dict(ok=0, failed=0, wall=0.,
+                                                             cpu=0., last=0., rss=0))
+            s["ok" if record["ok"] else "failed"] += 1
+            s["wall"] += record["wall"]
+            s["cpu"] += record["cpu"]
+            s["last"] = record["wall"]
+            s["rss"] = record["peak_rss"]
+            self._append(dict(event="end", **record))
+            self._write_textfile()
+
+    def observe_threads(self, stage, workers, threads, cores):
+        with self.lock:
+            self.threads[stage] = dict(processes=workers, threads=threads, cores=cores)
+            self._append(dict(event="threads", stage=stage, time=time.time(),
+                              pid=os.getpid(), **self.threads[stage]))
+            self._write_textfile()
+
+    def observe_latency(self, seconds):
+        with self.lock:
+            for i, bound in enumerate(Metrics.latency_buckets):
+                if seconds <= bound:
+                    self.latency[i] += 1
+            self.latency_sum += seconds
+            self.latency_count += 1
+            self._write_textfile()
+
+    def _write_textfile(self):
+        lines = []
+
+        def metric(name, kind, doc, samples):
+            lines.append(f"# HELP agraphaday_{name} {doc}")
+            lines.append(f"# TYPE agraphaday_{name} {kind}")
+            for labels, value in samples:
+                labels = ",".join('{}="{}"'.format(*i) for i in labels.items())
+                lines.append(f"agraphaday_{name}{{{labels}}} {value}")
+
+        stages = self.stages.items()
+        metric("stage_runs_total", "counter", "Finished stages.",
+               [(dict(stage=k, outcome=o), s[o]) for k, s in stages for o in ("ok", "failed")])
+        metric("stage_wall_seconds_total", "counter", "Wall time spent in the stage.",
+               [(dict(stage=k), s["wall"]) for k, s in stages])
+        metric("stage_cpu_seconds_total", "counter", "CPU time of this process in the stage.",
+               [(dict(stage=k), s["cpu"]) for k, s in stages])
+        metric("stage_last_wall_seconds", "gauge", "Wall time of the last run of the stage.",
+               [(dict(stage=k), s["last"]) for k, s in stages])
+        metric("stage_peak_rss_bytes", "gauge", "Peak resident memory of the last run.",
+               [(dict(stage=k), s["rss"]) for k, s in stages])
+        metric("stage_running_since_seconds", "gauge", "Start time of the running stage.",
+               [(dict(stage=k), t) for k, t in self.running.items()])
+        metric("stage_threads", "gauge", "Last split of the cores of the stage.",
+               [(dict(stage=k, of=o), s[o]) for k, s in self.threads.items()
+                for o in ("processes", "threads", "cores")])
+
+        buckets = [(dict(le="+Inf" if b == float("inf") else b), n)
+                   for b, n in zip(Metrics.latency_buckets, self.latency)]
+        metric("reply_latency_seconds", "histogram",
+               "Time from a mention to the posted answer.", [])
+        for labels, n in buckets:
+            lines.append('agraphaday_reply_latency_seconds_bucket{{le="{}"}} {}'
+                         .format(labels["le"], n))
+        lines.append(f"agraphaday_reply_latency_seconds_sum {self.latency_sum}")
+        lines.append(f"agraphaday_reply_latency_seconds_count {self.latency_count}")
+
+        # the collector must never see a half written file
+        os.makedirs(Metrics.folder, exist_ok=True)
+        path = os.path.join(Metrics.folder, Metrics.textfile)
+        with open(path + ".tmp", "w") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(path + ".tmp", path)
+
+
+registry = Registry()
+
+
+class Deferred:
+    """Keeps the measurements of a forked process, whose parent records
+    them, see defer(). The files belong to the parent, whose counters a
+    child would overwrite."""
+    def __init__(self):
+        self.records = []
+
+    def start(self, stage):
+        pass
+
+    def end(self, record):
+        self.records.append(record)
+
+    def observe_threads(self, stage, workers, threads, cores):
+        # the split of the parent is recorded, this is its share
+        pass
+
+
+def defer():
+    """Keep the measurements of this (forked) process instead of writing them.
+
+    Returns the Deferred, whose records are passed to record() in the parent.
+    """
+    global registry
+    registry = Deferred()
+    return registry
+
+
+def record(records):
+    """Record the measurements of stages which ran in another process."""
+    for r in records:
+        registry.end(r)
+
+
+@contextmanager
+def instrument(stage, labels=None):
+    """Measure the wall and cpu time and the peak memory of a stage.
+
+    stage   -- name of the stage, e.g., "layout"
+    labels  -- function returning a dict of details like generator, N, M,
+               layout and style; it is called at the end of the stage, when
+               they are known
+
+    The start of the stage is logged right away, the measurements when the
+    stage ends, also if it raises. The peak resident memory is that of the
+    stage, where Linux allows to reset it, otherwise of the process so far.
+    """
+    per_stage = _reset_peak_rss()
+    if Metrics.tracemalloc:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+    registry.start(stage)
+
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    children = _children_cpu()
+    ok = False
+    try:
+        yield
+        ok = True
+    finally:
+        record = dict(stage=stage, ok=ok, time=time.time(), pid=os.getpid(),
+                      wall=time.perf_counter() - wall,
+                      cpu=time.process_time() - cpu,
+                      cpu_children=_children_cpu() - children,
+                      peak_rss=_peak_rss(),
+                      peak_rss_of="stage" if per_stage else "process")
+        if Metrics.tracemalloc:
+            record["tracemalloc_peak"] = tracemalloc.get_traced_memory()[1]
+        if labels is not None:
+            try:
+                record.update(labels())
+            except Exception as e:
+                record["labels_error"] = repr(e)
+        registry.end(record)
+
+
+def observe_threads(stage, workers, threads, cores):
+    """Record how the cores were split between processes and threads."""
+    registry.observe_threads(stage, workers, threads, cores)
+
+
+def observe_reply_latency(seconds):
+    """Record the time from a mention to the posted answer."""
+    registry.observe_latency(seconds)
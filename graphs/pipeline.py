@@ -0,0 +1,432 @@
+import random
+import hashlib
+import traceback
+import multiprocessing
+import multiprocessing.connection
+
+import numpy as np
+import networkx as nx
+import scipy.sparse.linalg
+import cairo
+
+from .nx2gt.nx2gt import nx2gt
+from .visualize import gt, RetryableError
+from .visualize import GtLayout, NxLayout, GvLayout, GtStyle
+from .visualize import compute_layout, check_positions, compute_style
+from .blockmodel import fit_blockmodel, refine_later, refinements
+from .background import background
+from .visualize import plan_drawing, Centralities
+from .visualize import render_graphtool, render_blockmodel, save_png, write_targets
+from .visualize import check_png, has_explicit_coordinates
+from .composite import png_bytes, surface_from_png
+from .targets import default_targets, render_size
+from .surface_pool import surface_pool
+from .threads import budget, limit_threads, init_worker
+from .metrics import instrument, defer, record
+
+
+# some layouts fail for some graphs, then another candidate is tried, see
+# PlotPipeline.speculate(); other exceptions are bugs and are raised
+layout_failures = (ValueError, ArithmeticError, nx.NetworkXException,
+                   scipy.sparse.linalg.ArpackNoConvergence, cairo.Error)
+
+
+def reseed(seed):
+    """Seed all random number generators used while drawing with seed."""
+    random.seed(seed)
+    s = int.from_bytes(hashlib.sha256(seed.encode()).digest()[:4], "little")
+    np.random.seed(s)
+    gt.seed_rng(s)
+
+
+class PlotPipeline:
+    """Generate and draw a graph in explicit stages.
+
+    All intermediate results are kept as attributes. If a stage raises a
+    RetryableError, only the stage named by the error (or the failing stage
+    itself) and the following stages are repeated with a new sub-seed, at
+    most max_retries times.
+
+    graphGenerator  -- function returning a graph and its details
+    basename        -- path of the output without extension
+    absdir          -- directory of this project
+    seed            -- seed of this plot, sub-seeds for retries derive from it
+    style           -- style to use, random allowed style if None
+    layout          -- layout to use, random allowed layout if None
+    """
+    stages = ["generate", "convert", "layout", "style", "render", "postprocess"]
+    # stages which speculate() runs in the candidates
+    speculative_stages = ["layout", "style", "render"]
+    max_retries = 5
+    # when to compress the written png maximally, see save_png()
+    optimize = "background"
+    # seconds for fitting a blockmodel, unless one of a larger budget is cached
+    blockmodel_budget = 600
+    # seconds to keep improving the blockmodel in the background, or None
+    blockmodel_refine = None
+    # number of randomly chosen allowed layouts to try in parallel, if no
+    # layout is given, see speculate()
+    candidates = 1
+    # images written from one render at the largest size, the first one is
+    # the main image, see write_targets(); e.g., archive_targets
+    targets = default_targets
+
+    def __init__(self, graphGenerator, basename, absdir, seed,
+                 style=None, layout=None):
+        self.graphGenerator = graphGenerator
+        self.basename = basename
+        self.absdir = absdir
+        self.seed = seed
+        self.style = style
+        self.layout = layout
+        self.requested_layout = layout
+        # layouts whose positions were rejected, see rejectLayout()
+        self.rejected_layouts = []
+
+        self.details = {}
+        self.retries = []
+        self.current = None
+        # layouts tried by speculate(), the winning layout and its sub-seed
+        self.tried = []
+        self.winner = None
+        self.winner_png = None
+        self.speculated = False
+
+    @property
+    def blockmodel(self):
+        return self.layout == "Blockmodel"
+
+    def stageGenerate(self):
+        self.G, self.details = self.graphGenerator()
+
+        if self.style is None:
+            self.style = random.choice(self.details["allowed_styles"])
+
+        if self.layout is None:
+            self.layout = random.choice(self.details["allowed_layouts"])
+
+        if not (self.blockmodel
+                or self.layout == "explicit"
+                or self.layout in GtLayout().layouts
+                or self.layout in GvLayout().layouts
+                or self.layout in NxLayout().layouts):
+            raise ValueError("unknown layout: {}".format(self.layout))
+
+    def stageConvert(self):
+        self.g = nx2gt(self.G)
+
+        if not self.blockmodel and self.style not in GtStyle().styles:
+            print(self.style, "not valid, draw random style")
+            self.style = GtStyle().randomStyle()
+
+    def stageLayout(self):
+        limit_threads(budget("layout")[1])
+        if self.blockmodel:
+            self.state = fit_blockmodel(self.G, self.g,
+                                        budget=self.blockmodel_budget)
+            self.layout_used = "Blockmodel"
+            return
+
+        # if we lay out again after a failure, the cached layout is suspect
+        relayout = any(stage == "layout" for stage, _ in self.retries)
+        self.layout_used, self.positions = compute_layout(self.G, self.g, self.layout,
+                                                          use_cache=not relayout)
+        # reject empty or boring drawings before anything is rendered
+        try:
+            check_positions(self.g, self.positions,
+                            fixed=self.layout_used == "explicit")
+        except RetryableError as e:
+            if e.stage == "layout":
+                e.stage = self.rejectLayout()
+            raise
+
+    def stageStyle(self):
+        if self.blockmodel:
+            self.style_dict = None
+            return
+
+        limit_threads(budget("style")[1])
+        fixed = self.layout_used == "explicit"
+        self.pos, self.style_dict = compute_style(self.g, self.positions,
+                                                  self.style, fixed=fixed,
+                                                  size=render_size(self.targets))
+
+    def stageRender(self):
+        if self.blockmodel:
+            self.surface = render_blockmodel(self.state, render_size(self.targets))
+        else:
+            self.surface = render_graphtool(self.g, self.pos, self.style_dict)
+
+    def stagePostprocess(self):
+        if self.speculated:
+            # the winner was checked already
+            self.surface = surface_from_png(self.winner_png)
+            check_size = False
+        else:
+            check_size = not self.blockmodel
+
+        try:
+            self.paths, images = write_targets(self.surface, self.basename, self.targets,
+                                               check_size=check_size,
+                                               optimize=self.optimize)
+        finally:
+            surface_pool.release(self.surface)
+            self.surface = None
+        self.path, self.png = self.paths[0], images[0]
+
+        if self.blockmodel and self.blockmodel_refine is not None:
+            # only queued here, after the winner is chosen: a candidate is
+            # forked and exits without waiting for its queue
+            refine_later(self.G, self.g, self.blockmodel_refine)
+
+    def rejectLayout(self):
+        """Decide how to go on after the positions of the layout were rejected.
+
+        Many layouts ignore the seed (e.g., Spectral), laying out the same
+        graph again would give the same positions. Without a requested
+        layout another allowed one is chosen. A requested layout gets one
+        more graph, if it fails again, another allowed layout is used, too.
+
+        Returns the stage to repeat.
+        """
+        self.rejected_layouts.append(self.layout)
+        remaining = [l for l in self.details["allowed_layouts"]
+                     if l not in self.rejected_layouts]
+        if not remaining or self.rejected_layouts.count(self.requested_layout) == 1:
+            return "generate"
+
+        rejected = self.layout
+        self.layout = random.choice(remaining)
+        print("layout {} rejected, use {} instead".format(rejected, self.layout))
+        return "layout"
+
+    def speculate(self):
+        """Run the layout, style and render stages for several layouts at once.
+
+        If no layout was requested, up to `candidates` allowed layouts are
+        chosen at random and every one is drawn in a forked process with
+        its own sub-seed. The first image which passes all checks is used,
+        the other processes are terminated. The winner is recorded, such
+        that the image can be reproduced with its layout and sub-seed.
+        The stages of the candidates are measured in the candidates and
+        recorded here, run() does not measure them again. A candidate raising anything but a RetryableError or
+        one of layout_failures aborts the drawing, unless another candidate
+        won already.
+
+        The candidates use a single OpenMP thread: libgomp does not survive
+        a fork after it started its thread pool, a forked child waits
+        forever for the threads of its parent, if it starts a parallel
+        region with more than one thread. For the same reason the
+        background queues are paused while forking, such that none of their
+        threads holds a lock, e.g. of stdout, which the child would wait for
+        forever. A refinement pauses after its current sweep.
+
+        Returns whether the stages were run.
+        """
+        if (self.candidates < 2 or self.requested_layout is not None
+                or has_explicit_coordinates(self.G)):
+            return False
+
+        allowed = self.details["allowed_layouts"]
+        layouts = random.sample(allowed, min(self.candidates, len(allowed)))
+        if len(layouts) < 2:
+            return False
+
+        _, threads = budget("candidates", len(layouts))
+        ctx = multiprocessing.get_context("fork")
+        pending = {}
+        with background.paused(), refinements.paused():
+            for layout in layouts:
+                subseed = "{}/{}{}".format(self.seed, layout, len(self.retries))
+                recv, send = ctx.Pipe(duplex=False)
+                p = ctx.Process(target=self._candidate,
+                                args=(layout, subseed, send, threads), daemon=True)
+                p.start()
+                send.close()
+                pending[recv] = (layout, subseed, p)
+        processes = [p for _, _, p in pending.values()]
+
+        winner = None
+        errors = []
+        failures = []
+        while pending and winner is None and not errors:
+            for conn in multiprocessing.connection.wait(list(pending)):
+                layout, subseed, p = pending.pop(conn)
+                try:
+                    status, result, records = conn.recv()
+                except EOFError:
+                    status, result, records = "failed", ("worker died", "layout"), []
+                record(records)
+                if status == "ok" and winner is None:
+                    winner = layout, subseed, result
+                elif status == "failed":
+                    print("candidate {} failed: {}".format(layout, result[0]))
+                    failures.append(result[1])
+                elif status == "error":
+                    errors.append((layout, result))
+
+        # cancel the candidates which are still running
+        for _, _, p in pending.values():
+            p.terminate()
+        for p in processes:
+            p.join()
+
+        self.tried = layouts
+        if winner is None and errors:
+            raise RuntimeError("candidate {} raised an unexpected error:\n{}".format(*errors[0]))
+        for layout, result in errors:
+            # the winner of the same batch is kept
+            print("candidate {} raised an unexpected error:\n{}".format(layout, result))
+        if winner is None:
+            # repeat the earliest stage any of the candidates asked for
+            stage = min(failures, key=self.stages.index)
+            raise RetryableError("all candidates failed", stage=stage)
+
+        self.layout, subseed, (self.layout_used, self.winner_png) = winner
+        self.winner = self.layout, subseed
+        print("candidate {} won (seed '{}') of {}".format(self.layout, subseed, layouts))
+        return True
+
+    def _candidate(self, layout, subseed, conn, threads):
+        """Draw with layout in a forked process, send the png through conn.
+
+        Sends the status ("ok", "failed" or "error"), the result and the
+        measurements of the stages.
+        """
+        # see speculate() for the single OpenMP thread
+        init_worker(threads, openmp=1)
+        measurements = defer()
+        self.candidates = 1
+        self.speculated = False
+        self.layout = layout
+        reseed(subseed)
+
+        def labels():
+            return dict(self.metric_labels(), candidate=layout)
+
+        try:
+            for stage in self.speculative_stages:
+                self.current = stage
+                with instrument(stage, labels):
+                    getattr(self, "stage" + stage.capitalize())()
+            try:
+                png = png_bytes(self.surface)
+            finally:
+                surface_pool.release(self.surface)
+            if not self.blockmodel:
+                check_png(png)
+            message = "ok", (self.layout_used, png)
+        except RetryableError as e:
+            message = "failed", (str(e), e.stage or self.current)
+        except layout_failures as e:
+            # some layouts just fail for some graphs, another one is tried
+            message = "failed", (repr(e), "layout")
+        except Exception:
+            traceback.print_exc()
+            message = "error", traceback.format_exc()
+        try:
+            conn.send((*message, measurements.records))
+        finally:
+            conn.close()
+
+    @property
+    def style_detail(self):
+        if self.blockmodel:
+            return "style = {}, layout = {}".format("Blockmodel", "Blockmodel")
+        return "style = {}, layout = {}".format(self.style, self.layout_used)
+
+    def metric_labels(self):
+        """Details of the drawing attached to the measurements of a stage."""
+        G = getattr(self, "G", None)
+        return dict(seed=self.seed, generator=self.details.get("name"),
+                    N=G.number_of_nodes() if G is not None else None,
+                    M=G.number_of_edges() if G is not None else None,
+                    layout=getattr(self, "layout_used", self.layout),
+                    style=self.style, retries=len(self.retries))
+
+    def run(self, start="generate"):
+        """Run all stages from start on, returns the path and style details."""
+        while True:
+            try:
+                for stage in self.stages[self.stages.index(start):]:
+                    self.current = stage
+                    if stage == self.speculative_stages[0]:
+                        self.speculated = self.speculate()
+                    if self.speculated and stage in self.speculative_stages:
+                        # the candidates ran and measured it already
+                        continue
+                    with instrument(stage, self.metric_labels):
+                        getattr(self, "stage" + stage.capitalize())()
+                return self.path, self.style_detail
+            except RetryableError as e:
+                if len(self.retries) >= self.max_retries:
+                    print("giving up after {} retries".format(len(self.retries)))
+                    raise
+
+                start = e.stage or self.current
+                subseed = "{}/{}{}".format(self.seed, start, len(self.retries) + 1)
+                self.retries.append((start, subseed))
+                reseed(subseed)
+                print("retry {}/{}: stage '{}' failed ({}), restart from stage '{}' with seed '{}'"
+                      .format(len(self.retries), self.max_retries, self.current,
+                              e, start, subseed))
+
+
+# drawings for the render workers of draw_styles, inherited by forking
+_style_jobs = []
+
+
+def _render_style(i):
+    g, pos, style_dict = _style_jobs[i]
+    surface = render_graphtool(g, pos, style_dict)
+    try:
+        return png_bytes(surface)
+    finally:
+        surface_pool.release(surface)
+
+
+def draw_styles(G, basename, layout, styles=None, workers=None):
+    """Draw G from a single layout in several styles.
+
+    G           -- networkx graph
+    basename    -- path of the output without extension, the name of the
+                   style is appended
+    layout      -- layout to use
+    styles      -- names of the styles to draw, all styles if None
+    workers     -- number of render processes, one per style if None, at
+                   most one per core, see budget()
+
+    The layout, the resolution plan with the node sizes and the
+    centralities are calculated once and shared by all styles. The renders
+    are independent of each other and run in parallel.
+
+    Returns a dict mapping the styles to the paths of the images.
+    """
+    global _style_jobs
+
+    if styles is None:
+        styles = GtStyle().styles
+
+    g = nx2gt(G)
+    layout, positions = compute_layout(G, g, layout)
+    fixed = layout == "explicit"
+    check_positions(g, positions, fixed)
+
+    plan = plan_drawing(g, positions, fixed)
+    centralities = Centralities(g)
+    _style_jobs = [(g, *compute_style(g, positions, style, fixed, plan=plan,
+                                      centralities=centralities))
+                   for style in styles]
+
+    workers, threads = budget("render", workers or len(styles))
+    with multiprocessing.get_context("fork").Pool(workers, init_worker,
+                                                  (threads,)) as pool:
+        pngs = pool.map(_render_style, range(len(styles)))
+    _style_jobs = []
+
+    paths = {}
+    for style, png in zip(styles, pngs):
+        paths[style] = f"{basename}_{style}.png"
+        save_png(png, paths[style], check_size=False)
+
+    return paths
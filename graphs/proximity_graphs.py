@@ -1,5 +1,8 @@
+import math
 import random
+import itertools
 
+import numpy as np
 import networkx as nx
 import scipy.spatial
 
@@ -19,55 +22,84 @@ def dt(G):
     points = list(G.nodes())
     delaunay = scipy.spatial.Delaunay(points, qhull_options="QJ")
 
-    # create a set for edges that are indexes of the points
-    edges = set()
-    # for each Delaunay triangle
-    for n in range(delaunay.nsimplex):
-        # iterate over the 3 vertices of the simplex
-        for i, j in [(0, 1), (1, 2), (2, 0)]:
-            # sorting since edges may appear multiple times,
-            # if they are always sorted, the set will kill duplicates
-            u, v = sorted((delaunay.vertices[n, i], delaunay.vertices[n, j]))
-            edges.add((points[u], points[v]))
+    # the 3 edges of every Delaunay triangle, sorted such that edges of two
+    # triangles are found as duplicates
+    s = delaunay.simplices
+    edges = np.sort(np.vstack([s[:, [0, 1]], s[:, [1, 2]], s[:, [2, 0]]]), axis=1)
+    edges = np.unique(edges, axis=0)
 
-    G.add_edges_from(edges)
+    G.add_edges_from((points[u], points[v]) for u, v in edges)
 
     return G
 
 
+def _remove_blocked(G, center, radius, blocks):
+    """Remove the edges of G with a node in their forbidden region.
+
+    center      -- (M, 2) array, one point per edge of G
+    radius      -- (M,) array, the forbidden region of an edge lies within
+                   radius of its center
+    blocks      -- function of the end points a, b (both (K, 2) arrays) and
+                   the candidates c ((K, 2) array) returning whether the
+                   candidates lie in the forbidden region
+
+    The candidates are found by a k-d tree, such that this is O(N log N)
+    for the proximity graphs instead of checking all nodes for all edges.
+    """
+    nodes = list(G.nodes())
+    index = {v: i for i, v in enumerate(nodes)}
+    points = np.array(nodes, dtype=float)
+    edges = np.array([(index[u], index[v]) for u, v in G.edges()],
+                     dtype=np.int64).reshape(-1, 2)
+
+    tree = scipy.spatial.cKDTree(points)
+    candidates = tree.query_ball_point(center, radius, return_sorted=False)
+    edge = np.repeat(np.arange(len(edges)), [len(c) for c in candidates])
+    candidate = np.fromiter(itertools.chain.from_iterable(candidates),
+                            dtype=np.int64, count=len(edge))
+
+    # the end points themselves do not block
+    u, v = edges[edge, 0], edges[edge, 1]
+    mask = (candidate != u) & (candidate != v)
+    edge, candidate = edge[mask], candidate[mask]
+    inside = blocks(points[u[mask]], points[v[mask]], points[candidate])
+
+    blocked = np.unique(edge[inside])
+    G.remove_edges_from((nodes[i], nodes[j]) for i, j in edges[blocked])
+    return G
+
+
+def _edge_geometry(G):
+    a = np.array([u for u, v in G.edges()], dtype=float).reshape(-1, 2)
+    b = np.array([v for u, v in G.edges()], dtype=float).reshape(-1, 2)
+    return a, b
+
+
 def rng(G):
     G = dt(G)
-    to_remove = set()
-    for c1, c2 in G.edges():
-        if c1 == c2:
-            continue
-        d = dist(c1, c2)
-        for possible_blocker in G.nodes():
-            if c1 == possible_blocker or c2 == possible_blocker:
-                continue
-            distToC1 = dist(possible_blocker, c1)
-            distToC2 = dist(possible_blocker, c2)
-            if distToC1 < d and distToC2 < d:
-                # this node is in the lune and blocks
-                to_remove.add((c1, c2))
-    G.remove_edges_from(to_remove)
-    return G
+    a, b = _edge_geometry(G)
+    d = np.linalg.norm(a - b, axis=1)
+
+    def in_lune(a, b, c):
+        d = np.linalg.norm(a - b, axis=1)
+        return ((np.linalg.norm(c - a, axis=1) < d)
+                & (np.linalg.norm(c - b, axis=1) < d))
+
+    # the lune lies within the circle around the midpoint through its tips,
+    # slightly enlarged against rounding
+    return _remove_blocked(G, (a + b) / 2, d * (math.sqrt(3) / 2 + 1e-9), in_lune)
 
 
 def gg(G):
     G = dt(G)
-    to_remove = set()
-    for c1, c2 in G.edges():
-        mid = ((c1[0] + c2[0]) / 2, (c1[1] + c2[1]) / 2)
-        r = dist(c1, c2) / 2
-        for possible_blocker in G.nodes():
-            if c1 == possible_blocker or c2 == possible_blocker:
-                continue
-            if dist(possible_blocker, mid) <= r:
-                # this node is in the lune and blocks
-                to_remove.add((c1, c2))
-    G.remove_edges_from(to_remove)
-    return G
+    a, b = _edge_geometry(G)
+    r = np.linalg.norm(a - b, axis=1) / 2
+
+    def in_circle(a, b, c):
+        r = np.linalg.norm(a - b, axis=1) / 2
+        return np.linalg.norm(c - (a + b) / 2, axis=1) <= r
+
+    return _remove_blocked(G, (a + b) / 2, r * (1 + 1e-9), in_circle)
 
 
 def mst(G):
@@ -86,12 +118,13 @@ def mr(G, r=None):
     if r is None:
         r = max(e[2]["weight"] for e in tmp.edges(data=True))
 
-    for c1 in G.nodes():
-        for c2 in G.nodes():
-            if c1 == c2:
-                continue
-            if dist(c1, c2) <= r:
-                G.add_edge(c1, c2)
+    nodes = list(G.nodes())
+    tree = scipy.spatial.cKDTree(np.array(nodes, dtype=float))
+    # r is the length of an edge of the tree, the kd-tree may round its own
+    # distance above it, so query a bit further and compare exactly
+    pairs = tree.query_pairs(r * (1 + 1e-9), output_type="ndarray")
+    G.add_edges_from((nodes[i], nodes[j]) for i, j in pairs
+                     if dist(nodes[i], nodes[j]) <= r)
     return G
 
 
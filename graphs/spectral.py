@@ -0,0 +1,145 @@
+import random
+import warnings
+
+import numpy as np
+import scipy.linalg
+import scipy.sparse
+import scipy.sparse.csgraph
+import scipy.sparse.linalg
+
+from .forcelayout import coarsen
+
+
+# components up to this size are solved by a dense eigendecomposition
+dense_limit = 500
+# stop coarsening if the Laplacian shrinks by less than this
+min_shrink = 0.8
+# LOBPCG iterations on every level of the hierarchy
+refine_iterations = 30
+# gap between packed components, a component with n nodes is sqrt(n) wide
+gap = 2.
+
+
+def laplacian(n, edges):
+    """Sparse Laplacian of the undirected graph with n nodes and these edges."""
+    A = scipy.sparse.coo_matrix((np.ones(len(edges)), (edges[:, 0], edges[:, 1])),
+                                shape=(n, n)).tocsr()
+    A = A + A.T
+    # multi-edges count once, self loops do not count at all
+    A.data[:] = 1.
+    A.setdiag(0)
+    A.eliminate_zeros()
+    return scipy.sparse.csr_matrix(scipy.sparse.csgraph.laplacian(A))
+
+
+def fiedler_vectors(L, rng):
+    """Eigenvectors of the second and third smallest eigenvalue of L.
+
+    Small Laplacians are solved directly. Large ones are coarsened like in
+    the Barnes-Hut layout, the coarsest generalized eigenproblem
+    P^T L P x = lambda P^T P x is solved directly and its solution is
+    interpolated level by level and refined by a few LOBPCG iterations,
+    which are cheap since they start close to the solution.
+    """
+    n = L.shape[0]
+    B = scipy.sparse.identity(n, format="csr")
+    hierarchy = []
+    while L.shape[0] > dense_limit:
+        m = L.shape[0]
+        edges = np.column_stack(scipy.sparse.triu(L, k=1).nonzero())
+        cluster, coarse, _, _ = coarsen(m, edges, np.ones(m), rng)
+        if coarse > min_shrink * m:
+            break
+        P = scipy.sparse.csr_matrix((np.ones(m), (np.arange(m), cluster)),
+                                    shape=(m, coarse))
+        hierarchy.append((L, B, P))
+        L = (P.T @ L @ P).tocsr()
+        B = (P.T @ B @ P).tocsr()
+
+    if L.shape[0] > dense_limit:
+        # coarsening stalled
+        xy = _refine(L, B, rng.uniform(-1, 1, (L.shape[0], 2)), refine_iterations * 10)
+    else:
+        _, vectors = scipy.linalg.eigh(L.toarray(), B.toarray())
+        # the first eigenvector is constant, 1d components have no third one
+        xy = np.zeros((L.shape[0], 2))
+        xy[:, :vectors.shape[1] - 1] = vectors[:, 1:3]
+
+    for L, B, P in reversed(hierarchy):
+        xy = _refine(L, B, P @ xy, refine_iterations)
+
+    return xy
+
+
+def _refine(L, B, xy, iterations):
+    n = L.shape[0]
+    jacobi = scipy.sparse.diags(1. / np.maximum(L.diagonal(), 1e-12))
+    with warnings.catch_warnings():
+        # a few iterations are enough for a drawing, do not warn if the
+        # eigenvectors did not converge to full precision
+        warnings.simplefilter("ignore")
+        _, xy = scipy.sparse.linalg.lobpcg(L, xy, B=B, M=jacobi, Y=np.ones((n, 1)),
+                                           largest=False, tol=1e-6, maxiter=iterations)
+    return xy
+
+
+def pack(layouts):
+    """Arrange layouts of components row by row, largest first.
+
+    layouts -- list of (n, 2) arrays
+
+    Returns the translated layouts in the same order.
+    """
+    boxes = [(p.max(axis=0) - p.min(axis=0)) + gap for p in layouts]
+    width = max(np.sqrt(sum(w * h for w, h in boxes)),
+                max(w for w, _ in boxes))
+
+    packed = [None] * len(layouts)
+    x = y = row = 0.
+    for i in sorted(range(len(layouts)), key=lambda i: -len(layouts[i])):
+        w, h = boxes[i]
+        if x > 0 and x + w > width:
+            x, y, row = 0., y + row, 0.
+        packed[i] = layouts[i] - layouts[i].min(axis=0) + (x, y)
+        x += w
+        row = max(row, h)
+    return packed
+
+
+def spectral_layout(n, edges, seed=None):
+    """Spectral layout of a graph with n nodes from its (M, 2) edge array.
+
+    Every connected component is laid out by the eigenvectors of its
+    Laplacian belonging to the two smallest nonzero eigenvalues, scaled to
+    an area proportional to its number of nodes, and the components are
+    packed next to each other.
+
+    The coarsening of large components is seeded by seed, or if it is None,
+    by a number drawn from `random`.
+
+    Returns an (n, 2) array of positions.
+    """
+    if seed is None:
+        seed = random.getrandbits(32)
+    rng = np.random.RandomState(seed)
+
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    L = laplacian(n, edges)
+    count, component = scipy.sparse.csgraph.connected_components(L, directed=False)
+
+    members = np.split(np.argsort(component, kind="stable"),
+                       np.cumsum(np.bincount(component, minlength=count))[:-1])
+
+    layouts = []
+    for nodes in members:
+        if len(nodes) == 1:
+            layouts.append(np.zeros((1, 2)))
+            continue
+        xy = fiedler_vectors(L[nodes][:, nodes], rng)
+        extent = (xy.max(axis=0) - xy.min(axis=0)).max() or 1.
+        layouts.append(xy * np.sqrt(len(nodes)) / extent)
+
+    positions = np.zeros((n, 2))
+    for nodes, xy in zip(members, pack(layouts)):
+        positions[nodes] = xy
+    return positions
@@ -0,0 +1,98 @@
+import threading
+
+import numpy as np
+import cairo
+
+
+class SurfacePool:
+    """Reusable ARGB32 image surfaces for long running processes.
+
+    Every surface draws into a numpy pixel buffer owned by the pool.
+    Released surfaces are kept (at most max_free per size) and handed out
+    again, cleared to transparent, instead of allocating a new buffer of
+    tens of megabytes for every drawing, which fragments the heap of a
+    process running for days.
+
+    max_free    -- number of unused surfaces kept per size
+    """
+    def __init__(self, max_free=2):
+        self.max_free = max_free
+        self.free = {}
+        self.lent = set()
+        self.peak = 0
+        self.allocated = 0
+        self.reused = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _new(size):
+        w, h = size
+        stride = cairo.ImageSurface.format_stride_for_width(cairo.FORMAT_ARGB32, w)
+        pixels = np.zeros(stride * h, dtype=np.uint8)
+        return cairo.ImageSurface.create_for_data(pixels, cairo.FORMAT_ARGB32,
+                                                  w, h, stride)
+
+    def preallocate(self, *sizes):
+        """Allocate one free surface for every size, e.g., canvas_size."""
+        for size in sizes:
+            size = tuple(int(i) for i in size)
+            self.free.setdefault(size, []).append(self._new(size))
+            self.allocated += 1
+
+    def acquire(self, size):
+        """A transparent surface of size (width, height)."""
+        size = tuple(int(i) for i in size)
+        with self.lock:
+            free = self.free.get(size)
+            surface = free.pop() if free else None
+            if surface is None:
+                self.allocated += 1
+            else:
+                self.reused += 1
+
+        if surface is None:
+            surface = self._new(size)
+        else:
+            surface.flush()
+            np.ndarray(shape=(len(surface.get_data()),), dtype=np.uint8,
+                       buffer=surface.get_data()).fill(0)
+            surface.mark_dirty()
+
+        with self.lock:
+            self.lent.add(surface)
+            self.peak = max(self.peak, len(self.lent))
+        return surface
+
+    def release(self, surface):
+        """Return a surface from acquire(), it must not be used afterwards.
+
+        Surfaces not from this pool are ignored.
+        """
+        with self.lock:
+            if surface not in self.lent:
+                return
+            self.lent.discard(surface)
+            size = (surface.get_width(), surface.get_height())
+            free = self.free.setdefault(size, [])
+            if len(free) < self.max_free:
+                free.append(surface)
+                return
+        surface.finish()
+
+    def stats(self):
+        nbytes = sum(s.get_stride() * s.get_height()
+                     for s in self.lent.union(*self.free.values()))
+        return dict(in_use=len(self.lent),
+                    free=sum(len(i) for i in self.free.values()),
+                    peak=self.peak,
+                    allocated=self.allocated,
+                    reused=self.reused,
+                    bytes=nbytes)
+
+    def report(self):
+        return ("surface pool: {in_use} in use, {free} free, peak {peak}, "
+                "{allocated} allocated, {reused} reused, {mb:.0f} MB"
+                .format(mb=self.stats()["bytes"] / 2**20, **self.stats()))
+
+
+surface_pool = SurfacePool()
@@ -0,0 +1,114 @@
+import io
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import cairo
+
+from .composite import png_bytes, pixel_color, canvas_size
+from .surface_pool import surface_pool
+
+
+# an output image: size (width, height), format ("png", "webp" or "jpeg")
+# and quality of the lossy formats (0-100), None for the default
+Target = namedtuple("Target", ["size", "format", "quality"],
+                    defaults=("png", None))
+
+# the tweet image
+default_targets = [Target(canvas_size)]
+# e.g., the tweet image, an archive copy at full resolution and a preview
+archive_targets = [Target(canvas_size),
+                   Target((4096, 2048)),
+                   Target((512, 256), "webp", 80)]
+
+extensions = dict(png="png", webp="webp", jpeg="jpg")
+default_quality = dict(webp=80, jpeg=90)
+
+
+def render_size(targets):
+    """The size to render, such that every target can be scaled down from it."""
+    return max((t.size for t in targets), key=lambda s: s[0] * s[1])
+
+
+def target_paths(basename, targets):
+    """The first target is the main image, the others are named by size."""
+    paths = []
+    for i, t in enumerate(targets):
+        ext = extensions[t.format]
+        if i == 0:
+            paths.append(f"{basename}.{ext}")
+        else:
+            paths.append("{}_{}x{}.{}".format(basename, *t.size, ext))
+    return paths
+
+
+def encode(surface, fmt, quality=None):
+    """Encode an ARGB32 surface as png, webp or jpeg."""
+    if fmt == "png":
+        return png_bytes(surface)
+
+    from PIL import Image
+
+    surface.flush()
+    # cairo stores premultiplied alpha in native byte order
+    image = Image.frombuffer("RGBA", (surface.get_width(), surface.get_height()),
+                             surface.get_data(), "raw", "BGRa",
+                             surface.get_stride(), 1)
+    if fmt == "jpeg":
+        image = image.convert("RGB")
+    buf = io.BytesIO()
+    image.save(buf, fmt.upper(),
+               quality=quality if quality is not None else default_quality[fmt])
+    return buf.getvalue()
+
+
+def scale(surface, size):
+    """Scale the finished image down to size onto a canvas of the pool.
+
+    Unlike composite(), the image is neither trimmed nor rotated, it is
+    only resized to fit and centered on its background color.
+    """
+    X, Y = size
+    w, h = surface.get_width(), surface.get_height()
+    factor = min(X / w, Y / h)
+
+    canvas = surface_pool.acquire((X, Y))
+    cr = cairo.Context(canvas)
+    cr.set_source_rgba(*pixel_color(surface))
+    cr.paint()
+
+    cr.translate((X - w * factor) / 2, (Y - h * factor) / 2)
+    cr.scale(factor, factor)
+    cr.set_source_surface(surface, 0, 0)
+    cr.get_source().set_filter(cairo.FILTER_GOOD)
+    cr.rectangle(0, 0, w, h)
+    cr.fill()
+    canvas.flush()
+
+    return canvas
+
+
+def _encode_target(surface, target):
+    w, h = target.size
+    if (w, h) == (surface.get_width(), surface.get_height()):
+        return encode(surface, target.format, target.quality)
+
+    scaled = scale(surface, (w, h))
+    try:
+        return encode(scaled, target.format, target.quality)
+    finally:
+        surface_pool.release(scaled)
+
+
+def encode_targets(surface, targets):
+    """Scale and encode the rendered surface for every target in parallel.
+
+    Scaling (cairo) and encoding (cairo, Pillow) release the GIL, such
+    that threads suffice.
+
+    Returns a list of the encoded images in the order of targets.
+    """
+    if len(targets) == 1:
+        return [_encode_target(surface, targets[0])]
+
+    with ThreadPoolExecutor(len(targets)) as executor:
+        return list(executor.map(lambda t: _encode_target(surface, t), targets))
@@ -0,0 +1,73 @@
+import os
+
+import graph_tool
+
+from .metrics import observe_threads
+
+
+class ThreadBudget:
+    """Division of the cores between worker processes and their threads.
+
+    graph_tool (sfdp_layout, betweenness, blockmodels) and BLAS use all
+    cores by default, which oversubscribes the machine as soon as several
+    processes draw at once.
+    """
+    # cores to use, all cores available to this process if None; a worker
+    # process is restricted to its share by init_worker()
+    cores = None
+
+
+def available_cores():
+    if ThreadBudget.cores:
+        return ThreadBudget.cores
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def budget(stage, workers=1):
+    """Split the cores for stage between workers processes.
+
+    Returns the number of processes (at most one per core) and the number
+    of threads for each of them. The split is recorded in the metrics.
+    """
+    cores = available_cores()
+    workers = max(1, min(workers, cores))
+    threads = max(1, cores // workers)
+    print("threads for {}: {} processes x {} threads of {} cores"
+          .format(stage, workers, threads, cores))
+    observe_threads(stage, workers, threads, cores)
+    return workers, threads
+
+
+def limit_threads(threads, openmp=None):
+    """Use at most threads OpenMP and BLAS threads in this process.
+
+    openmp  -- OpenMP threads of graph_tool, threads if None
+
+    The environment variables only take effect for libraries loaded
+    afterwards and for subprocesses, threadpoolctl (if installed) adjusts
+    BLAS libraries already loaded. The cores of the process stay available
+    to later stages, worker processes use init_worker().
+    """
+    for var in ["OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"]:
+        os.environ[var] = str(threads)
+    if graph_tool.openmp_enabled():
+        graph_tool.openmp_set_num_threads(threads if openmp is None else openmp)
+
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(threads)
+    except ImportError:
+        pass
+
+
+def init_worker(threads, openmp=None):
+    """Restrict a worker process to its share of threads cores.
+
+    Initializer of pool workers and forked candidates, a budget() in the
+    worker then splits only its share.
+    """
+    ThreadBudget.cores = threads
+    limit_threads(threads, openmp)
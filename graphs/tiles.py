@@ -0,0 +1,172 @@
+import math
+import multiprocessing
+
+import numpy as np
+import graph_tool.all as gt
+import cairo
+
+from .threads import budget, init_worker, available_cores
+
+
+class Tiles:
+    """Parameters of the tiled rendering of large drawings."""
+    # side of a tile in pixels
+    side = 512
+    # graphs with fewer nodes plus edges are drawn in a single pass
+    min_primitives = 50000
+    # number of render processes, one per core if None
+    workers = None
+
+
+def _scalars(style_dict, key, n, default):
+    value = style_dict.get(key, default)
+    if hasattr(value, "a"):
+        return np.asarray(value.a, dtype=float)
+    return np.full(n, float(value))
+
+
+def bounding_boxes(g, pos, style_dict):
+    """Boxes (x0, y0, x1, y1) in pixels around every node and edge.
+
+    Returns the boxes of the nodes, NaN for nodes filtered out of g, and
+    the boxes of the edges together with the edges as (M, 3) array of
+    source, target and edge index.
+    """
+    # properties are indexed by the vertex index, also if g is a view
+    xy = pos.get_2d_array([0, 1]).T
+    N = len(xy)
+    # one pixel more for the antialiasing
+    radius = (_scalars(style_dict, "vertex_size", N, 5.) / 2
+              + _scalars(style_dict, "vertex_pen_width", N, 0.8) + 1)
+    nodes = np.full((N, 4), np.nan)
+    v = g.get_vertices()
+    nodes[v] = np.column_stack([xy[v] - radius[v, None], xy[v] + radius[v, None]])
+
+    edges = g.get_edges([g.edge_index])
+    n = g.edge_index_range
+    pad = _scalars(style_dict, "edge_pen_width", n, 1.)[edges[:, 2]] / 2 + 1
+    if g.is_directed():
+        pad += _scalars(style_dict, "edge_marker_size", n, 4.)[edges[:, 2]]
+    control = style_dict.get("edge_control_points")
+    if control is not None and len(edges):
+        # the splines stay within their control points, which are at most
+        # the largest perpendicular offset away from the straight edge
+        k = len(control[g.edge(edges[0, 0], edges[0, 1])])
+        offsets = control.get_2d_array(range(1, k, 2))[:, edges[:, 2]]
+        pad += np.abs(offsets).max(axis=0)
+    a, b = xy[edges[:, 0]], xy[edges[:, 1]]
+    lo = np.minimum(a, b) - pad[:, None]
+    hi = np.maximum(a, b) + pad[:, None]
+
+    return nodes, np.column_stack([lo, hi]), edges
+
+
+def tile_index(boxes, size, side):
+    """Spatial index of boxes on a grid of tiles of side pixels.
+
+    Returns a list with the indices of the boxes intersecting every tile,
+    the tiles are numbered row by row.
+    """
+    w, h = size
+    nx, ny = math.ceil(w / side), math.ceil(h / side)
+    visible = ((boxes[:, 2] >= 0) & (boxes[:, 0] <= w)
+               & (boxes[:, 3] >= 0) & (boxes[:, 1] <= h))
+    ids = np.flatnonzero(visible)
+    x0, y0, x1, y1 = (np.clip((boxes[ids, i] // side).astype(np.int64), 0, m - 1)
+                      for i, m in zip(range(4), (nx, ny, nx, ny)))
+
+    # one entry for every tile covered by a box
+    width = x1 - x0 + 1
+    counts = width * (y1 - y0 + 1)
+    k = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    width = np.repeat(width, counts)
+    tile = ((np.repeat(y0, counts) + k // width) * nx
+            + np.repeat(x0, counts) + k % width)
+    box = np.repeat(ids, counts)
+
+    order = np.argsort(tile, kind="stable")
+    bounds = np.cumsum(np.bincount(tile, minlength=nx * ny))
+    return np.split(box[order], bounds[:-1])
+
+
+def tile_rects(size, side):
+    w, h = size
+    return [(x, y, min(side, w - x), min(side, h - y))
+            for y in range(0, h, side) for x in range(0, w, side)]
+
+
+# tiles for the render workers of render_tiled, inherited by forking
+_tile_jobs = None
+
+
+def _render_tile(i):
+    g, pos, kwargs, bg_color, rects, node_tiles, edge_tiles, edges = _tile_jobs
+    x, y, w, h = rects[i]
+    surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, w, h)
+    cr = cairo.Context(surface)
+    cr.set_source_rgba(*bg_color)
+    cr.paint()
+
+    tile_edges = edges[edge_tiles[i]]
+    vfilt = g.new_vertex_property("bool")
+    vfilt.a[node_tiles[i]] = True
+    # the end points of the edges must be in the view to draw the edges
+    vfilt.a[tile_edges[:, 0]] = True
+    vfilt.a[tile_edges[:, 1]] = True
+    efilt = g.new_edge_property("bool")
+    efilt.a[tile_edges[:, 2]] = True
+    view = gt.GraphView(g, vfilt=vfilt, efilt=efilt)
+
+    cr.translate(-x, -y)
+    try:
+        gt.cairo_draw(view, pos, cr, **kwargs)
+    except cairo.Error:
+        return None
+    surface.flush()
+    return bytes(surface.get_data())
+
+
+def use_tiles(g):
+    """Whether g is large enough to be rendered in tiles, which is not
+    possible within the workers of a process pool."""
+    return (g.num_vertices() + g.num_edges() >= Tiles.min_primitives
+            and not multiprocessing.current_process().daemon)
+
+
+def render_tiled(g, pos, style_dict, surface):
+    """Draw g like cairo_draw onto surface, split into tiles drawn in parallel.
+
+    Every tile gets only the nodes and edges whose bounding boxes intersect
+    it and is drawn by cairo_draw with the same style, shifted to the tile.
+    Since the order of the nodes and edges within the tile is unchanged,
+    the result equals a single pass up to the antialiasing at the seams.
+    """
+    global _tile_jobs
+
+    kwargs = dict(style_dict)
+    size = kwargs.pop("output_size")
+    bg_color = kwargs.pop("bg_color", (1, 1, 1, 1))
+
+    node_boxes, edge_boxes, edges = bounding_boxes(g, pos, style_dict)
+    rects = tile_rects(size, Tiles.side)
+    _tile_jobs = (g, pos, kwargs, bg_color, rects,
+                  tile_index(node_boxes, size, Tiles.side),
+                  tile_index(edge_boxes, size, Tiles.side), edges)
+
+    surface.flush()
+    stride = surface.get_stride()
+    pixels = np.ndarray(shape=(surface.get_height(), stride), dtype=np.uint8,
+                        buffer=surface.get_data())
+    try:
+        workers, threads = budget("render", Tiles.workers or available_cores())
+        with multiprocessing.get_context("fork").Pool(workers, init_worker,
+                                                      (threads,)) as pool:
+            for (x, y, w, h), data in zip(rects, pool.imap(_render_tile, range(len(rects)))):
+                if data is None:
+                    raise cairo.Error("cairo error in a tile")
+                tile = np.frombuffer(data, dtype=np.uint8).reshape(h, -1)
+                pixels[y:y + h, 4 * x:4 * (x + w)] = tile[:, :4 * w]
+    finally:
+        _tile_jobs = None
+    surface.mark_dirty()
+    print("rendered {} tiles of {} px".format(len(rects), Tiles.side))
@@ -0,0 +1,62 @@
+import numpy as np
+
+
+class Rule:
+    """Thresholds of the pre-render checks."""
+    # at least this many edges
+    min_edges = 1
+    # at most this fraction of the nodes may have no edges
+    max_isolated = 0.9
+    # at most this fraction of nodes may share their pixel with another node
+    max_collapsed = 0.5
+    # the shorter side of the bounding box relative to the longer side
+    min_aspect = 1e-3
+    # resolution used to decide whether two nodes are at the same position
+    resolution = 2048
+
+
+def check_drawable(edges, positions):
+    """Find out whether a drawing would be empty or boring before drawing it.
+
+    edges       -- (M, 2) array of the node indices of the edges
+    positions   -- (N, 2) array of the positions, None to check only the graph
+
+    Returns None if the drawing looks fine, or a tuple of the violated rule,
+    a description and the stage which should be repeated, "generate" for a
+    boring graph and "layout" for broken positions.
+    """
+    edges = np.asarray(edges).reshape(-1, 2)
+    M = len(edges)
+    if M < Rule.min_edges:
+        return "edges", "only {} edges".format(M), "generate"
+
+    if positions is None:
+        return None
+
+    positions = np.asarray(positions, dtype=float)
+    N = len(positions)
+
+    degree = np.bincount(edges.ravel(), minlength=N)
+    isolated = np.count_nonzero(degree == 0) / N
+    if isolated > Rule.max_isolated:
+        return "isolated", "{:.0%} isolated nodes".format(isolated), "generate"
+
+    if not np.isfinite(positions).all():
+        return "finite", "positions are NaN or infinite", "layout"
+
+    lo = positions.min(axis=0)
+    hi = positions.max(axis=0)
+    w, h = hi - lo
+    if max(w, h) == 0:
+        return "collapsed", "all nodes at the same position", "layout"
+    if min(w, h) / max(w, h) < Rule.min_aspect:
+        return "area", "bounding box {:g} x {:g}".format(w, h), "generate"
+
+    pixels = np.floor((positions - lo) / max(w, h) * Rule.resolution)
+    _, inverse, counts = np.unique(pixels, axis=0, return_inverse=True,
+                                   return_counts=True)
+    collapsed = np.count_nonzero(counts.ravel()[inverse.ravel()] > 1) / N
+    if collapsed > Rule.max_collapsed:
+        return "collapsed", "{:.0%} of nodes on top of each other".format(collapsed), "layout"
+
+    return None
@@ -0,0 +1,234 @@
+import math
+
+import numpy as np
+import cairo
+
+
+# the defaults of graph_tool.draw, in pixels
+vertex_defaults = dict(vertex_size=5., vertex_fill_color=(0.640625, 0, 0, 0.9),
+                       vertex_color=(0.5, 0.5, 0.5, 0.8), vertex_pen_width=0.8,
+                       vertex_shape="circle")
+edge_defaults = dict(edge_color=(0.179, 0.203, 0.210, 0.8), edge_pen_width=1.)
+
+# number of edges or nodes written as one path at most
+chunk = 10000
+
+
+def _colormap():
+    try:
+        from graph_tool.draw.cairo_draw import default_cm
+        return default_cm
+    except ImportError:
+        # matplotlib.colormaps is not available in 3.3 of debian bullseye
+        import matplotlib.cm
+        return matplotlib.cm.get_cmap("magma")
+
+
+def _scalars(value, n):
+    if hasattr(value, "a"):
+        return np.asarray(value.a, dtype=float)
+    return np.full(n, float(value))
+
+
+def _colors(value, n, cmap):
+    """rgba array (n, 4) of a color given as tuple, scalar or vector map."""
+    if not hasattr(value, "a") and not hasattr(value, "get_2d_array"):
+        return np.tile(np.asarray(value, dtype=float), (n, 1))
+    if value.value_type().startswith("vector"):
+        return value.get_2d_array([0, 1, 2, 3]).T
+    # scalars are mapped through the color map like graph_draw does
+    x = np.asarray(value.a, dtype=float)
+    lo, hi = x.min(), x.max()
+    return np.asarray(cmap((x - lo) / ((hi - lo) or 1.)), dtype=float)
+
+
+def _order(value, n):
+    if value is None:
+        return np.arange(n)
+    return np.argsort(np.asarray(value.a, dtype=float), kind="stable")
+
+
+def _runs(keys):
+    """Start and end of the runs of equal rows of keys, at most chunk long."""
+    change = np.flatnonzero((np.diff(keys, axis=0) != 0).any(axis=1)) + 1
+    bounds = np.concatenate([[0], change, [len(keys)]])
+    for a, b in zip(bounds[:-1], bounds[1:]):
+        for s in range(a, b, chunk):
+            yield s, min(s + chunk, b)
+
+
+def primitives(g, pos, style_dict):
+    """Drawing commands for g in the drawing order of graph_draw.
+
+    pos         -- positions in pixels (property map)
+    style_dict  -- style of GtStyle, see compute_style()
+
+    Yields ("edges", segments, color, width) with segments an array of
+    shape (k, p, 2) of the points of k polylines or cubic Bezier curves
+    (p = 4), and ("nodes", centers, sizes, shape, fill, stroke, width).
+    Consecutive edges or nodes with the same style are merged into one
+    command, such that every command becomes one path.
+    """
+    cmap = _colormap()
+    N = g.num_vertices()
+    xy = pos.get_2d_array([0, 1]).T
+
+    # edges are drawn first, edge properties are indexed by the edge index
+    edges = g.get_edges([g.edge_index])
+    M = len(edges)
+    if M:
+        style = dict(edge_defaults, **style_dict)
+        n = g.edge_index_range
+        order = _order(style_dict.get("eorder"), n)
+        order = order[np.isin(order, edges[:, 2])]
+        index = np.empty(n, dtype=np.int64)
+        index[edges[:, 2]] = np.arange(M)
+        edges = edges[index[order]]
+
+        colors = _colors(style["edge_color"], n, cmap)[order]
+        widths = _scalars(style["edge_pen_width"], n)[order]
+        a, b = xy[edges[:, 0]], xy[edges[:, 1]]
+        control = style_dict.get("edge_control_points")
+        if control is not None:
+            # control points are (fraction along the edge, distance
+            # perpendicular to it), like in graph_draw
+            k = len(control[g.edge(edges[0, 0], edges[0, 1])])
+            cp = control.get_2d_array(range(k)).T[order].reshape(M, -1, 2)
+            d = b - a
+            normal = np.column_stack([-d[:, 1], d[:, 0]])
+            normal /= np.maximum(np.linalg.norm(normal, axis=1), 1e-12)[:, None]
+            segments = (a[:, None] + cp[:, :, :1] * d[:, None]
+                        + cp[:, :, 1:] * normal[:, None])
+        else:
+            segments = np.stack([a, b], axis=1)
+
+        keys = np.column_stack([colors, widths])
+        for s, e in _runs(keys):
+            yield "edges", segments[s:e], tuple(colors[s]), widths[s]
+
+    style = dict(vertex_defaults, **style_dict)
+    sizes = _scalars(style["vertex_size"], N)
+    fill = _colors(style["vertex_fill_color"], N, cmap)
+    stroke = _colors(style["vertex_color"], N, cmap)
+    width = _scalars(style["vertex_pen_width"], N)
+    order = _order(style_dict.get("vorder"), N)
+    keys = np.column_stack([fill, stroke, width])[order]
+    for s, e in _runs(keys):
+        i = order[s:e]
+        yield ("nodes", xy[i], sizes[i], style["vertex_shape"],
+               tuple(fill[i[0]]), tuple(stroke[i[0]]), width[i[0]])
+
+
+def _svg_color(c):
+    """svg color and opacity of an rgba tuple."""
+    r, g, b, a = c
+    return "rgb({:.0f},{:.0f},{:.0f})".format(255 * r, 255 * g, 255 * b), "{:.3f}".format(a)
+
+
+def _svg_paint(attr, c):
+    rgb, opacity = _svg_color(c)
+    return '{0}="{1}" {0}-opacity="{2}"'.format(attr, rgb, opacity)
+
+
+def _svg_path(f, d, fill=None, stroke=None, width=0.):
+    attrs = []
+    attrs.append(_svg_paint("fill", fill) if fill else 'fill="none"')
+    if stroke:
+        attrs.append(_svg_paint("stroke", stroke))
+        attrs.append('stroke-width="{:.3f}"'.format(width))
+    f.write('<path {} d="'.format(" ".join(attrs)))
+    f.writelines(d)
+    f.write('"/>\n')
+
+
+def _svg_edges(segments):
+    if segments.shape[1] == 4:
+        fmt = "M{:.2f} {:.2f}C{:.2f} {:.2f} {:.2f} {:.2f} {:.2f} {:.2f}"
+    else:
+        fmt = "M{:.2f} {:.2f}" + "L{:.2f} {:.2f}" * (segments.shape[1] - 1)
+    return (fmt.format(*s) for s in segments.reshape(len(segments), -1))
+
+
+def _svg_nodes(centers, sizes, shape):
+    for (x, y), s in zip(centers, sizes):
+        r = s / 2
+        if shape == "square":
+            h = r / math.sqrt(2)
+            yield "M{:.2f} {:.2f}h{:.2f}v{:.2f}h{:.2f}z".format(x - h, y - h, 2 * h, 2 * h, -2 * h)
+        else:
+            yield "M{:.2f} {:.2f}a{r:.2f} {r:.2f} 0 1 0 {d:.2f} 0a{r:.2f} {r:.2f} 0 1 0 {m:.2f} 0".format(
+                x - r, y, r=r, d=2 * r, m=-2 * r)
+
+
+def write_svg(outfile, size, bg_color, commands):
+    w, h = size
+    with open(outfile, "w") as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        f.write('<svg xmlns="http://www.w3.org/2000/svg" width="{0}" height="{1}" '
+                'viewBox="0 0 {0} {1}">\n'.format(w, h))
+        f.write('<rect width="100%" height="100%" {}/>\n'
+                .format(_svg_paint("fill", bg_color)))
+        for command in commands:
+            if command[0] == "edges":
+                _, segments, color, width = command
+                _svg_path(f, _svg_edges(segments), stroke=color, width=width)
+            else:
+                _, centers, sizes, shape, fill, stroke, width = command
+                _svg_path(f, _svg_nodes(centers, sizes, shape), fill=fill,
+                          stroke=stroke, width=width)
+        f.write("</svg>\n")
+
+
+def write_pdf(outfile, size, bg_color, commands):
+    # cairo writes the content stream of the page directly into the file
+    surface = cairo.PDFSurface(outfile, *size)
+    cr = cairo.Context(surface)
+    cr.set_source_rgba(*bg_color)
+    cr.paint()
+    cr.set_line_cap(cairo.LINE_CAP_ROUND)
+    for command in commands:
+        if command[0] == "edges":
+            _, segments, color, width = command
+            for s in segments:
+                cr.move_to(*s[0])
+                if len(s) == 4:
+                    cr.curve_to(*s[1], *s[2], *s[3])
+                else:
+                    for p in s[1:]:
+                        cr.line_to(*p)
+            cr.set_source_rgba(*color)
+            cr.set_line_width(width)
+            cr.stroke()
+        else:
+            _, centers, sizes, shape, fill, stroke, width = command
+            for (x, y), s in zip(centers, sizes):
+                cr.new_sub_path()
+                if shape == "square":
+                    h = s / 2 / math.sqrt(2)
+                    cr.rectangle(x - h, y - h, 2 * h, 2 * h)
+                else:
+                    cr.arc(x, y, s / 2, 0, 2 * math.pi)
+            cr.set_source_rgba(*fill)
+            cr.fill_preserve()
+            cr.set_source_rgba(*stroke)
+            cr.set_line_width(width)
+            cr.stroke()
+    surface.finish()
+
+
+def render_vector(g, pos, style_dict, outfile):
+    """Write g drawn in a GtStyle style as svg or pdf, depending on outfile.
+
+    Nodes and edges are written in the order graph_draw draws them, edges
+    and nodes of the same style in a row share one path. Only the commands
+    for one path are in memory at a time. Edge markers (arrows) are not
+    drawn.
+    """
+    size = style_dict.get("output_size")
+    bg_color = style_dict.get("bg_color", (1, 1, 1, 1))
+    commands = primitives(g, pos, style_dict)
+    if outfile.endswith(".pdf"):
+        write_pdf(outfile, size, bg_color, commands)
+    else:
+        write_svg(outfile, size, bg_color, commands)
+    return outfile
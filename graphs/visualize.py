@@ -1,11 +1,16 @@
 import os
+import io
 import math
 import random
+import time
 import inspect
-from subprocess import call
+import multiprocessing
+from functools import cached_property
 
 import networkx as nx
 import numpy as np
+import scipy.spatial
+import scipy.spatial.distance
 
 # hack to suppress "Unable to init server: Could not connect: Connection refused"
 # errors on stderr, if not launched from an X session
@@ -17,10 +22,30 @@ import graph_tool.all as gt
 import cairo
 
 from .nx2gt.nx2gt import nx2gt
+from .layout_cache import layout_cache, fingerprint, edge_array, worth_caching
+from .forcelayout import barnes_hut_layout
+from .spectral import spectral_layout
+from .community import label_propagation, community_colors
+from .composite import composite, surface_from_png
+from .composite import plan_resolution, canvas_size, border
+from .background import background, optimize_png
+from .surface_pool import surface_pool
+from .targets import default_targets, render_size, target_paths, encode_targets
+from .vector import render_vector
+from .tiles import use_tiles, render_tiled
+from .validate import check_drawable
+from .blockmodel import fit_blockmodel
 
 
 class RetryableError(Exception):
-    pass
+    """Drawing this instance failed, but a new attempt might succeed.
+
+    stage -- the pipeline stage whose result caused the failure and which
+             should be repeated, None if the failing stage itself
+    """
+    def __init__(self, *args, stage=None):
+        super().__init__(*args)
+        self.stage = stage
 
 
 def has_explicit_coordinates(G):
@@ -85,7 +110,7 @@ class NxLayout:
 
     @staticmethod
     def layoutKamadaKawai(G):
-        return NxLayout.layoutNeato(G)
+        return GvLayout.layoutNeato(G)
 
     @staticmethod
     def layoutCircular(G):
@@ -97,10 +122,84 @@ class NxLayout:
 
     @staticmethod
     def layoutSpectral(G):
-        return nx.spectral_layout(G)
+        return spectral_layout(G.number_of_nodes(), edge_array(G))
+
+    @staticmethod
+    def layoutBarnesHut(G):
+        return barnes_hut_layout(G.number_of_nodes(), edge_array(G))
+
+
+def _agraph_positions(N, edges, directed, prog):
+    import pygraphviz
+
+    A = pygraphviz.AGraph(strict=False, directed=directed)
+    A.add_nodes_from(range(N))
+    A.add_edges_from(edges.tolist())
+    # without extra arguments pygraphviz lays out through libgvc in this
+    # process, instead of writing dot files for a graphviz subprocess
+    A.layout(prog=prog)
+
+    positions = np.zeros((N, 2))
+    for n in A.nodes_iter():
+        x, y = n.attr["pos"].split(",")[:2]
+        positions[int(n)] = float(x), float(y)
+    return positions
+
+
+# layout for the graphviz worker of graphviz_positions, inherited by forking
+_agraph_job = None
+
+
+def _forked_agraph_positions():
+    return _agraph_positions(*_agraph_job)
+
+
+def graphviz_positions(G, prog, timeout=None):
+    """Lay out G with the graphviz program prog using the library bindings.
+
+    G       -- networkx graph
+    prog    -- graphviz layout engine, e.g. "neato"
+    timeout -- seconds after which the layout is aborted (RetryableError)
+
+    Returns an (N, 2) array, whose i-th row is the position of the i-th
+    node of G (i.e. of vertex i after nx2gt).
+    """
+    global _agraph_job
+
+    N = G.number_of_nodes()
+    index = {v: i for i, v in enumerate(G.nodes())}
+    edges = np.array([(index[u], index[v]) for u, v in G.edges()],
+                     dtype=np.int64).reshape(-1, 2)
+
+    if timeout is None:
+        return _agraph_positions(N, edges, G.is_directed(), prog)
+
+    # a running graphviz layout can not be interrupted from python, so we do
+    # the layout in a forked copy of this process, which we can kill
+    # the edges are inherited by the fork instead of being pickled
+    _agraph_job = N, edges, G.is_directed(), prog
+    try:
+        with multiprocessing.get_context("fork").Pool(1) as pool:
+            result = pool.apply_async(_forked_agraph_positions)
+            try:
+                return result.get(timeout)
+            except multiprocessing.TimeoutError:
+                print(f"graphviz layout '{prog}' timed out after {timeout} s")
+                raise RetryableError
+    finally:
+        _agraph_job = None
+
+
+def positions_to_gt(g, positions):
+    """Convert an (N, 2) array of node positions to a property map."""
+    return g.new_vertex_property("vector<double>",
+                                 vals=np.asarray(positions, dtype=float))
 
 
 class GvLayout:
+    # seconds after which a graphviz layout is given up
+    timeout = 600
+
     def __init__(self):
         members = inspect.getmembers(GvLayout)
 
@@ -109,15 +208,15 @@ class GvLayout:
 
     @staticmethod
     def layoutDot(G):
-        return nx.nx_pydot.graphviz_layout(G, prog="dot")
+        return graphviz_positions(G, "dot", GvLayout.timeout)
 
     @staticmethod
     def layoutNeato(G):
-        return nx.nx_pydot.graphviz_layout(G, prog="neato")
+        return graphviz_positions(G, "neato", GvLayout.timeout)
 
     @staticmethod
     def layoutTwoPi(G):
-        return nx.nx_pydot.graphviz_layout(G, prog="twopi")
+        return graphviz_positions(G, "twopi", GvLayout.timeout)
 
 
 class GtLayout:
@@ -147,9 +246,121 @@ class GtLayout:
         return gt.radial_tree_layout(g, root_node)
 
 
+def approximate_betweenness(g, budget, seed=0, pivots=None, delta=0.05):
+    """Estimate vertex and edge betweenness of g from a sample of pivots.
+
+    g       -- graph
+    budget  -- time in seconds to spend, determines the number of pivots
+    seed    -- seed of the order in which the pivots are sampled
+    pivots  -- number of pivots, overrides the budget
+    delta   -- error probability of the returned error bound
+
+    The shortest paths starting from k random sources (pivots) are
+    accumulated and extrapolated (Brandes and Pich, 2007). The same seed and
+    number of pivots always give the same result. The values are normalized
+    like gt.betweenness() does, such that they do not change their scale
+    at exact_betweenness_limit.
+
+    Returns vertex and edge betweenness, the number of pivots and an error
+    bound: by Hoeffding's inequality, with probability 1 - delta, the
+    estimate of every single value is off by at most this fraction of the
+    largest possible betweenness.
+    """
+    N = g.num_vertices()
+    order = np.random.default_rng(seed).permutation(N)
+
+    # time a first batch to find out how many pivots fit into the budget
+    k = min(N, 16, pivots or N)
+    start = time.perf_counter()
+    vbet, ebet = gt.betweenness(g, pivots=order[:k], norm=False)
+    per_pivot = (time.perf_counter() - start) / k
+
+    if pivots is None:
+        pivots = int(min(N, max(k, budget / max(per_pivot, 1e-9))))
+    if pivots > k:
+        vrest, erest = gt.betweenness(g, pivots=order[k:pivots], norm=False)
+        vbet.a += vrest.a
+        ebet.a += erest.a
+
+    # extrapolate to all sources and normalize by the number of pairs
+    vpairs = max((N - 1) * (N - 2), 1)
+    epairs = max(N * (N - 1), 1)
+    if not g.is_directed():
+        vpairs /= 2
+        epairs /= 2
+    vbet.a *= N / pivots / vpairs
+    ebet.a *= N / pivots / epairs
+    error = 0. if pivots == N else math.sqrt(math.log(2 / delta) / (2 * pivots))
+
+    return vbet, ebet, pivots, error
+
+
+class Centralities:
+    """Centralities of g, calculated on first use and shared between styles.
+
+    The property maps are shared, styles which modify them need to copy
+    them first.
+
+    g           -- graph
+    communities -- labels of the first nodes to start the label propagation
+                   from, e.g., of the previous frame of an animation, such
+                   that the colors of the communities persist
+    """
+    # above this N * M, betweenness is estimated from sampled pivots
+    exact_betweenness_limit = 10**8
+    # seconds to spend on the estimation, determines the number of pivots
+    betweenness_budget = 60
+    betweenness_seed = 0
+    # fixed number of pivots instead of the budget, e.g., to reproduce a run
+    betweenness_pivots = None
+    # seconds and seed for the label propagation of the communities
+    community_budget = 10
+    community_seed = 0
+
+    def __init__(self, g, communities=None):
+        self.g = g
+        self.initial_communities = communities
+
+    @cached_property
+    def degree(self):
+        return self.g.degree_property_map("total")
+
+    @cached_property
+    def betweenness(self):
+        g = self.g
+        if g.num_vertices() * g.num_edges() <= Centralities.exact_betweenness_limit:
+            return gt.betweenness(g)
+
+        vbet, ebet, pivots, error = approximate_betweenness(
+            g, Centralities.betweenness_budget,
+            seed=Centralities.betweenness_seed,
+            pivots=Centralities.betweenness_pivots
+        )
+        print("approximate betweenness from {} pivots, error < {:.3f} (95%)"
+              .format(pivots, error))
+        return vbet, ebet
+
+    @cached_property
+    def hits(self):
+        return gt.hits(self.g)
+
+    @cached_property
+    def eigenvector(self):
+        return gt.eigenvector(self.g)
+
+    @cached_property
+    def communities(self):
+        labels = label_propagation(self.g.num_vertices(), self.g.get_edges(),
+                                   budget=Centralities.community_budget,
+                                   seed=Centralities.community_seed,
+                                   initial=self.initial_communities)
+        print("{} communities by label propagation".format(len(np.unique(labels))))
+        return self.g.new_vertex_property("int", vals=labels)
+
+
 class GtStyle:
+    # reference size of the drawing, the styles get the actual size as outsize
     outsize = (4096, 4096)
-    # outsize = (2046, 1022)
 
     def __init__(self):
         # get all methods that generate graphs (convention: starts with 'style')
@@ -165,190 +376,546 @@ class GtStyle:
         return style
 
     @staticmethod
-    def styleDegree(g, pos, fixed=False):
-        deg = g.degree_property_map("total")
+    def styleDegree(g, pos, fixed=False, outsize=None, node_size=None,
+                    centralities=None):
+        outsize = outsize or GtStyle.outsize
+        centralities = centralities or Centralities(g)
+        if node_size is None:
+            node_size = GtStyle.max_node_size(g, pos, fixed, outsize)
+        deg = centralities.degree.copy()
         deg.a += 1  # nodes with value zero should be 5% of maximum
-        deg.a = np.sqrt(deg.a) / np.sqrt(deg.a).max() * GtStyle.max_node_size(g, pos, fixed)
+        deg.a = np.sqrt(deg.a) / np.sqrt(deg.a).max() * node_size
         style_dict = dict(vertex_size=deg,
                           vertex_fill_color=deg,
                           vorder=deg,
-                          output_size=GtStyle.outsize,
+                          output_size=outsize,
                           bg_color=(1, 1, 1, 1))
 
         return style_dict
 
     @staticmethod
-    def styleBetweenness(g, pos, fixed=False):
-        deg = g.degree_property_map("total")
-        vbet, ebet = gt.betweenness(g)
+    def styleBetweenness(g, pos, fixed=False, outsize=None, node_size=None,
+                         centralities=None):
+        outsize = outsize or GtStyle.outsize
+        centralities = centralities or Centralities(g)
+        if node_size is None:
+            node_size = GtStyle.max_node_size(g, pos, fixed, outsize)
+        deg = centralities.degree
+        vbet, ebet = (m.copy() for m in centralities.betweenness)
         # nodes with value zero should be 5% of maximum
         vbet.a += max(vbet.a.max(), 1) * 0.05
         vbet.a = np.sqrt(vbet.a)
-        vbet.a /= vbet.a.max() / GtStyle.max_node_size(g, pos, fixed)
+        vbet.a /= vbet.a.max() / node_size
         ebet.a += 0.05 * ebet.a.max()
-        ebet.a /= ebet.a.max() / 10.
+        # edges are at most 10 px wide in a 4096 px wide image
+        ebet.a /= ebet.a.max() / (10. * GtStyle.scale(outsize))
         eorder = ebet.copy()
         eorder.a *= -1
         bg_color = (0.25, 0.25, 0.25, 1.0)
 
         style_dict = dict(vertex_size=vbet, vertex_fill_color=deg, vorder=vbet,
                           edge_color=ebet, eorder=eorder, edge_pen_width=ebet,
-                          output_size=GtStyle.outsize,
+                          output_size=outsize,
                           bg_color=bg_color)
 
         return style_dict
 
     @staticmethod
-    def styleCurved(g, pos, fixed=False):
-        eig, auth, hub = gt.hits(g)
+    def styleCurved(g, pos, fixed=False, outsize=None, node_size=None,
+                    centralities=None):
+        outsize = outsize or GtStyle.outsize
+        centralities = centralities or Centralities(g)
+        if node_size is None:
+            node_size = GtStyle.max_node_size(g, pos, fixed, outsize)
+        eig, auth, hub = centralities.hits
+        auth = auth.copy()
 
         auth.a += 1  # nodes with value zero should be 5% of maximum
-        auth.a = auth.a**2 / (auth.a**2).max() * GtStyle.max_node_size(g, pos, fixed)
+        auth.a = auth.a**2 / (auth.a**2).max() * node_size
 
         bg_color = (1, 1, 1, 1)
         # curvature: see http://main-discussion-list-for-the-graph-tool-project.982480.n3.nabble.com/Clarifications-in-docs-about-graph-draw-edge-control-points-and-splines-td4026216.html
-        control = g.new_edge_property("vector<double>")
-        for e in g.edges():
-            d = math.sqrt(sum((pos[e.source()].a - pos[e.target()].a)**2)) / 5
-            control[e] = [0.0, 0.0, 0.3, d, 0.7, d, 1.0, 0.0]
+        edges = g.get_edges([g.edge_index])
+        xy = pos.get_2d_array([0, 1]).T
+        d = g.new_edge_property("double")
+        d.a[edges[:, 2]] = np.linalg.norm(xy[edges[:, 0]] - xy[edges[:, 1]], axis=1) / 5
+        constant = [g.new_edge_property("double", val=c) for c in (0.0, 0.3, 0.7, 1.0)]
+        control = gt.group_vector_property([constant[0], constant[0], constant[1], d,
+                                            constant[2], d, constant[3], constant[0]],
+                                           value_type="double")
 
         style_dict = dict(vertex_fill_color=auth, vertex_size=auth,
                           edge_control_points=control,
-                          output_size=GtStyle.outsize,
+                          output_size=outsize,
                           bg_color=bg_color)
 
         return style_dict
 
     @staticmethod
-    def styleBlocky(g, pos, fixed=False):
-        lambda1, eig = gt.eigenvector(g)
+    def styleBlocky(g, pos, fixed=False, outsize=None, node_size=None,
+                    centralities=None):
+        outsize = outsize or GtStyle.outsize
+        centralities = centralities or Centralities(g)
+        if node_size is None:
+            node_size = GtStyle.max_node_size(g, pos, fixed, outsize)
+        lambda1, eig = centralities.eigenvector
+        eig = eig.copy()
 
         eig.a += 1  # nodes with value zero should be 5% of maximum
-        eig.a = np.sqrt(eig.a) / np.sqrt(eig.a).max() * GtStyle.max_node_size(g, pos, fixed)
+        eig.a = np.sqrt(eig.a) / np.sqrt(eig.a).max() * node_size
 
+        edges = g.get_edges([g.edge_index])
         ecol = g.new_edge_property("double")
-        for e in g.edges():
-            ecol[e] = max(eig[e.source()], eig[e.target()])
+        ecol.a[edges[:, 2]] = np.maximum(eig.a[edges[:, 0]], eig.a[edges[:, 1]])
 
         bg_color = (0.25, 0.25, 0.25, 1.0)
 
         style_dict = dict(vertex_fill_color=eig, vertex_size=eig,
                           vertex_shape="square",
                           edge_color=ecol,
-                          output_size=GtStyle.outsize,
+                          output_size=outsize,
                           bg_color=bg_color)
 
         return style_dict
 
+    @staticmethod
+    def styleCommunity(g, pos, fixed=False, outsize=None, node_size=None,
+                       centralities=None):
+        outsize = outsize or GtStyle.outsize
+        centralities = centralities or Centralities(g)
+        if node_size is None:
+            node_size = GtStyle.max_node_size(g, pos, fixed, outsize)
+        community = centralities.communities
+        deg = centralities.degree.copy()
+        deg.a += 1  # nodes with value zero should be 5% of maximum
+        deg.a = np.sqrt(deg.a) / np.sqrt(deg.a).max() * node_size
+
+        colors = community_colors(community.a)
+        vcol = g.new_vertex_property("vector<double>")
+        vcol.set_2d_array(colors.T)
+
+        # edges inside of a community in its color, others faint grey and
+        # drawn first
+        edges = g.get_edges([g.edge_index])
+        inside = community.a[edges[:, 0]] == community.a[edges[:, 1]]
+        ecolors = np.tile([0.5, 0.5, 0.5, 0.3], (len(edges), 1))
+        ecolors[inside] = colors[edges[inside, 0]]
+        ecolors[inside, 3] = 0.8
+        channels = [g.new_edge_property("double") for _ in range(4)]
+        for channel, values in zip(channels, ecolors.T):
+            channel.a[edges[:, 2]] = values
+        ecol = gt.group_vector_property(channels)
+        eorder = g.new_edge_property("int")
+        eorder.a[edges[:, 2]] = inside
+
+        style_dict = dict(vertex_size=deg, vertex_fill_color=vcol, vorder=deg,
+                          vertex_color=vcol,
+                          edge_color=ecol, eorder=eorder,
+                          output_size=outsize,
+                          bg_color=(1, 1, 1, 1))
+
+        return style_dict
+
     @staticmethod
     def mean_distance_from_gt_pos(g, pos, fixed=False):
-        ds = []
-        max_d = 0
-        for v in g.vertices():
-            for w in v.out_neighbours():
-                i = pos[v]
-                j = pos[w]
-                try:
-                    ds.append(math.sqrt((i[0] - j[0])**2 + (i[1] - j[1])**2))
-                except IndexError:
-                    print(v, w, i, j)
-                    raise RetryableError
+        try:
+            xy = pos.get_2d_array([0, 1]).T
+        except (IndexError, ValueError):
+            raise RetryableError("invalid positions", stage="layout")
+
+        edges = g.get_edges()
+        ds = np.linalg.norm(xy[edges[:, 0]] - xy[edges[:, 1]], axis=1)
+        if not g.is_directed():
+            # every edge is seen from both of its ends
+            ds = np.concatenate([ds, ds])
+        ds.sort()
         if fixed:
             # fixed nodes -> Geometric graph, take shortest 20% of edges
-            short_edges = sorted(ds)[:max(1, len(ds) // 5)]
+            short_edges = ds[:max(1, len(ds) // 5)]
         else:
             # not fixed -> take shortes 5% of egdes
-            short_edges = sorted(ds)[:max(1, len(ds) // 20)]
-        d = sum(short_edges) / len(short_edges)
-
-        for v in g.vertices():
-            for w in g.vertices():
-                i = pos[v]
-                j = pos[w]
-                try:
-                    tmp = math.sqrt((i[0] - j[0])**2 + (i[1] - j[1])**2)
-                except IndexError:
-                    print(v, w, i, j)
-                    raise RetryableError
-                max_d = max(tmp, max_d)
+            short_edges = ds[:max(1, len(ds) // 20)]
+        d = short_edges.sum() / len(short_edges)
+
+        # the largest distance is between two corners of the convex hull
+        try:
+            hull = xy[scipy.spatial.ConvexHull(xy).vertices]
+        except (scipy.spatial.QhullError, ValueError):
+            # too few or collinear points, then the extreme points suffice
+            hull = xy[[xy[:, 0].argmin(), xy[:, 0].argmax(),
+                       xy[:, 1].argmin(), xy[:, 1].argmax()]]
+        max_d = scipy.spatial.distance.pdist(hull).max(initial=0)
 
         return d, max_d
 
     @staticmethod
-    def max_node_size(g, pos, fixed=False):
+    def scale(outsize):
+        """Factor by which widths given in pixels for outsize are scaled."""
+        return min(outsize) / min(GtStyle.outsize)
+
+    @staticmethod
+    def max_node_size(g, pos, fixed=False, outsize=None):
         # calculate the node size: a node should have a diameter of the mean
         # neighbor distance, but only for the 10% of nearest neighbors
         mean_d, max_d = GtStyle.mean_distance_from_gt_pos(g, pos, fixed)
         # since node size is given in pixel and or coordinates are arbitary,
         # we need to rescale
         # we multiply by >1 since the node size is diameter and not radius
-        return 0.8 * mean_d / max_d * min(GtStyle.outsize)
+        return 0.8 * mean_d / max_d * min(outsize or GtStyle.outsize)
+
+
+def _layout_positions(G, g, layout, **params):
+    if layout in NxLayout().layouts:
+        positions = NxLayout().names[layout](G, **params)
+    elif layout in GvLayout().layouts:
+        positions = GvLayout().names[layout](G, **params)
+    elif layout in GtLayout().layouts:
+        positions = GtLayout().names[layout](g, **params).get_2d_array([0, 1]).T
+    else:
+        positions = gt.sfdp_layout(g, **params).get_2d_array([0, 1]).T
+
+    # networkx layouts return a dict keyed by the nodes
+    if isinstance(positions, dict):
+        positions = [positions[v] for v in G.nodes()]
+
+    return np.asarray(positions, dtype=float)
+
+
+def compute_layout(G, g, layout, use_cache=True, **params):
+    """Calculate the positions of the nodes of G.
+
+    G         -- networkx graph
+    g         -- the same graph converted by nx2gt
+    layout    -- name of the layout
+    use_cache -- look up the positions in the layout cache, if False a
+                 fresh layout is calculated and replaces the cached one;
+                 only graphs worth_caching() are cached at all
+    params    -- keyword arguments for the layout function, they are part
+                 of the cache key
+
+    Returns the name of the layout actually used and an (N, 2) array of
+    positions in the order of the vertices of g.
+    """
+    if has_explicit_coordinates(G):
+        return "explicit", np.array([[v[0] * 1000, v[1] * 1000] for v in G.nodes()])
+
+    if not worth_caching(G):
+        return layout, _layout_positions(G, g, layout, **params)
+
+    key = layout_cache.key(fingerprint(G), layout, **params)
+
+    positions = layout_cache.get(key) if use_cache else None
+    if positions is None or len(positions) != g.num_vertices():
+        positions = _layout_positions(G, g, layout, **params)
+        layout_cache.put(key, positions)
+
+    return layout, positions
+
+
+def check_positions(g, positions, fixed=False):
+    """Raise a RetryableError if drawing g at positions would be empty or boring."""
+    rejected = check_drawable(g.get_edges(), positions)
+    if rejected is not None:
+        rule, reason, stage = rejected
+        # explicit coordinates belong to the graph
+        if fixed:
+            stage = "generate"
+        print("rejected before rendering by rule '{}': {}".format(rule, reason))
+        raise RetryableError("{}: {}".format(rule, reason), stage=stage)
+
+
+def plan_drawing(g, positions, fixed=False, size=canvas_size):
+    """Plan the resolution of the drawing of g at positions.
+
+    g           -- graph
+    positions   -- (N, 2) array of positions in layout coordinates
+    fixed       -- whether the positions are explicit coordinates
+    size        -- size of the final image
+
+    Returns the positions in pixel coordinates as property map, the outsize
+    for the styles and the maximal node size in pixels. The plan does not
+    depend on the style and can be shared by several styles.
+    """
+    pos = positions_to_gt(g, positions)
+    node_size = GtStyle.max_node_size(g, pos, fixed, outsize=(1, 1))
+    pixels, extent = plan_resolution(positions, node_size, size)
+
+    return positions_to_gt(g, pixels), (extent, extent), node_size * extent
+
+
+def compute_style(g, positions, style, fixed=False, size=canvas_size,
+                  plan=None, centralities=None):
+    """Plan the resolution and calculate the style of the drawing.
+
+    g               -- graph
+    positions       -- (N, 2) array of positions in layout coordinates
+    style           -- name of the style
+    fixed           -- whether the positions are explicit coordinates
+    size            -- size of the final image
+    plan            -- result of plan_drawing, calculated if None
+    centralities    -- Centralities of g to share between styles
+
+    Returns the positions in pixel coordinates as property map and the
+    style dict for exactly this size.
+    """
+    if plan is None:
+        plan = plan_drawing(g, positions, fixed, size)
+    pos, outsize, node_size = plan
 
+    style_dict = GtStyle().names[style](g, pos, fixed, outsize=outsize,
+                                        node_size=node_size,
+                                        centralities=centralities)
 
-def draw_graphtool(G, basename, absdir, style, layout):
+    # the defaults of graph_tool are in pixels, scale them like everything
+    # else, as if we had drawn a 4096x4096 image and shrunk it
+    scale = GtStyle.scale(outsize)
+    style_dict.setdefault("vertex_pen_width", 0.8 * scale)
+    style_dict.setdefault("edge_pen_width", 1. * scale)
+    style_dict.setdefault("edge_marker_size", 4. * scale)
+    style_dict["output_size"] = size
+
+    return pos, style_dict
+
+
+class LevelOfDetail:
+    """Thresholds above which only the most important parts are drawn."""
+    nodes = 20000
+    edges = 50000
+    # maximal number of nodes plus edges to draw
+    primitives = 100000
+    # nodes with a smaller diameter (in pixels) are not drawn
+    min_node_size = 1.
+
+
+def _values(style_dict, key, n, default):
+    value = style_dict.get(key, default)
+    if hasattr(value, "a"):
+        return np.asarray(value.a, dtype=float)
+    return np.full(n, float(value))
+
+
+def level_of_detail(g, style_dict):
+    """Reduce large graphs to the primitives which are visible.
+
+    If g has more nodes or edges than the LevelOfDetail thresholds, nodes
+    smaller than a pixel are dropped and edges are sampled without
+    replacement with probabilities proportional to their importance (the
+    pen width if it depends on the edge, otherwise the size, i.e., the
+    centrality in the style, of their end points), such that at most
+    LevelOfDetail.primitives are drawn.
+
+    Returns g or a filtered GraphView of g.
+    """
+    N = g.num_vertices()
+    M = g.num_edges()
+    if N <= LevelOfDetail.nodes and M <= LevelOfDetail.edges:
+        return g
+
+    size = _values(style_dict, "vertex_size", N, 5.)
+    keep = size >= LevelOfDetail.min_node_size
+    # at least half of the budget is reserved for edges
+    max_nodes = LevelOfDetail.primitives // 2
+    if np.count_nonzero(keep) > max_nodes:
+        keep[np.argsort(-size)[max_nodes:]] = False
+
+    # source, target and index of every edge
+    edges = g.get_edges([g.edge_index])
+    candidates = np.flatnonzero(keep[edges[:, 0]] & keep[edges[:, 1]])
+    if hasattr(style_dict.get("edge_pen_width"), "a"):
+        width = _values(style_dict, "edge_pen_width", g.edge_index_range, 1.)
+        importance = width[edges[candidates, 2]]
+    else:
+        importance = np.maximum(size[edges[candidates, 0]], size[edges[candidates, 1]])
+
+    max_edges = LevelOfDetail.primitives - np.count_nonzero(keep)
+    if len(candidates) > max_edges:
+        # weighted sampling without replacement (Efraimidis and Spirakis)
+        keys = np.log(np.random.random(len(candidates))) / np.maximum(importance, 1e-12)
+        candidates = candidates[np.argsort(-keys)[:max_edges]]
+
+    vfilt = g.new_vertex_property("bool", vals=keep)
+    efilt = g.new_edge_property("bool")
+    efilt.a[edges[candidates, 2]] = True
+    print("level of detail: draw {} of {} nodes and {} of {} edges"
+          .format(np.count_nonzero(keep), N, len(candidates), M))
+
+    return gt.GraphView(g, vfilt=vfilt, efilt=efilt)
+
+
+def render_graphtool(g, pos, style_dict, lod=True):
+    """Draw g with positions in pixels into a cairo surface of the pool.
+
+    With lod, very large graphs are reduced by level_of_detail() first.
+    Large graphs are drawn in tiles by several processes, see render_tiled().
+    The surface should be released to surface_pool after use.
+    """
+    if lod:
+        g = level_of_detail(g, style_dict)
+
+    kwargs = dict(style_dict)
+    size = kwargs.pop("output_size")
+    bg_color = kwargs.pop("bg_color", (1, 1, 1, 1))
+
+    surface = surface_pool.acquire(size)
+    cr = cairo.Context(surface)
+    cr.set_source_rgba(*bg_color)
+    cr.paint()
+    try:
+        if use_tiles(g):
+            render_tiled(g, pos, style_dict, surface)
+        else:
+            gt.cairo_draw(g, pos, cr, **kwargs)
+    except cairo.Error:
+        print("some cairo error")
+        surface_pool.release(surface)
+        raise RetryableError("cairo error", stage="layout")
+    surface.flush()
+    return surface
+
+
+def render_blockmodel(state, size=canvas_size):
+    """Draw the hierarchy of state onto a new canvas of the given size."""
+    # draw_hierarchy does its own layout, which is roughly round, so we
+    # render a square fitting on the canvas and compose it afterwards
+    side = int(min(size) / (1 + 2 * border))
+    buf = io.BytesIO()
+    gt.draw_hierarchy(state,
+                           bg_color=(0.25, 0.25, 0.25, 1.0),
+                           output_size=(side, side),
+                           output=buf, fmt="png")
+    return composite(surface_from_png(buf.getvalue()), size)
+
+
+def check_png(png):
+    # test if the image is smaller than 10 kB, in that case something went
+    # wrong or it is probably too boring
+    if len(png) < 10e3:
+        print("apparently the output is empty, try again")
+        raise RetryableError("empty output", stage="generate")
+
+
+def save_png(png, outfile, check_size=True, optimize="background"):
+    """Write the encoded png to outfile.
+
+    png         -- the encoded image
+    outfile     -- path of the png to write
+    check_size  -- reject small, i.e., empty or boring, images
+    optimize    -- "background" to compress the file with optipng later in
+                   the background queue, "now" to do it before returning,
+                   None to keep the moderately compressed png of cairo
+
+    Returns png, such that it can be published right away.
+    """
+    if check_size:
+        check_png(png)
+
+    with open(outfile, "wb") as f:
+        f.write(png)
+
+    if optimize == "background":
+        background.submit(optimize_png, outfile)
+    elif optimize == "now":
+        optimize_png(outfile)
+
+    return png
+
+
+def write_targets(surface, basename, targets, check_size=True,
+                  optimize="background"):
+    """Write the rendered surface in every format and size of targets.
+
+    The first target is the main image, only it is checked for emptiness,
+    see save_png(). Returns the paths and the encoded images in the
+    order of targets.
+    """
+    data = encode_targets(surface, targets)
+    paths = target_paths(basename, targets)
+    if check_size:
+        check_png(data[0])
+
+    for target, path, image in zip(targets, paths, data):
+        if target.format == "png":
+            save_png(image, path, check_size=False, optimize=optimize)
+        else:
+            with open(path, "wb") as f:
+                f.write(image)
+
+    return paths, data
+
+
+def draw_graphtool(G, basename, absdir, style, layout, targets=None):
     """Draw the graph G using graph-tool.
 
     basename    -- filename
     absdir      -- output path
     style       -- style to use
     layout      -- layout to use
+    targets     -- list of Target (size, format, quality) to write, all are
+                   derived from one render at the largest size,
+                   default_targets if None
     """
+    targets = targets or default_targets
     g = nx2gt(G)
 
     if style not in GtStyle().styles:
         print(style, "not valid, draw random style")
         style = GtStyle().randomStyle()
 
-    if has_explicit_coordinates(G):
-        layout = "explicit"
-        pos = g.new_vertex_property("vector<double>")
-        for n, v in enumerate(G.nodes()):
-            pos[g.vertex(n)] = [v[0] * 1000, v[1] * 1000]
-    elif layout in NxLayout().layouts:
-        pos = g.new_vertex_property("vector<double>")
-        fixed_positions = NxLayout().names[layout](G)
-        for n, v in enumerate(G.nodes()):
-            pos[g.vertex(n)] = fixed_positions[v]
-    elif layout in GtLayout().layouts:
-        pos = GtLayout().names[layout](g)
-    else:
-        pos = gt.sfdp_layout(g)
+    layout, positions = compute_layout(G, g, layout)
+    check_positions(g, positions, fixed=layout == "explicit")
 
     details = "style = {}, layout = {}".format(style, layout)
 
-    infile = f"{basename}_raw.png"
-    outfile = f"{basename}.png"
-
-    style_dict = GtStyle().names[style](g, pos, fixed=layout == "explicit")
+    pos, style_dict = compute_style(g, positions, style, fixed=layout == "explicit",
+                                    size=render_size(targets))
 
+    surface = render_graphtool(g, pos, style_dict)
     try:
-        gt.graph_draw(g, pos=pos, output=infile, **style_dict)
-    except cairo.Error:
-        print("some cairo error")
-        raise RetryableError
+        paths, _ = write_targets(surface, basename, targets)
+    finally:
+        surface_pool.release(surface)
 
-    call([os.path.join(absdir, "svg2png.sh"), infile, outfile])
+    return paths[0], details
 
-    # test if the file is smaller than 10 kB, in that case something went wrong
-    # or it is probably too boring
-    if os.path.getsize(outfile) < 10e3:
-        print("apparently the output is empty, try again")
-        raise RetryableError
-    return outfile, details
 
+def draw_vector(G, basename, absdir, style, layout, fmt="svg", size=canvas_size):
+    """Draw the graph G as svg or pdf, e.g., for print.
+
+    fmt         -- "svg" or "pdf"
+    size        -- size of the page in pixels (svg) or points (pdf)
 
-def draw_blockmodel(G, basename, absdir, style, layout):
+    See draw_graphtool() for the other arguments. Every node and edge is
+    drawn, there is no level of detail.
+    """
     g = nx2gt(G)
-    state = gt.minimize_nested_blockmodel_dl(g)
 
-    details = "style = {}, layout = {}".format("Blockmodel", "Blockmodel")
+    if style not in GtStyle().styles:
+        print(style, "not valid, draw random style")
+        style = GtStyle().randomStyle()
 
-    infile = f"{basename}_raw.png"
-    outfile = f"{basename}.png"
+    layout, positions = compute_layout(G, g, layout)
+    check_positions(g, positions, fixed=layout == "explicit")
 
-    gt.draw_hierarchy(state,
-                           bg_color=(0.25, 0.25, 0.25, 1.0),
-                           output_size=(4096, 4096),
-                           output=infile)
-    call([os.path.join(absdir, "svg2png.sh"), infile, outfile])
-    return outfile, details
+    details = "style = {}, layout = {}".format(style, layout)
+
+    pos, style_dict = compute_style(g, positions, style, fixed=layout == "explicit",
+                                    size=size)
+    path = render_vector(g, pos, style_dict, f"{basename}.{fmt}")
+
+    return path, details
+
+
+def draw_blockmodel(G, basename, absdir, style, layout, targets=None):
+    """Draw the nested blockmodel of G, see draw_graphtool()."""
+    targets = targets or default_targets
+    g = nx2gt(G)
+    state = fit_blockmodel(G, g)
+
+    details = "style = {}, layout = {}".format("Blockmodel", "Blockmodel")
+
+    surface = render_blockmodel(state, render_size(targets))
+    try:
+        paths, _ = write_targets(surface, basename, targets, check_size=False)
+    finally:
+        surface_pool.release(surface)
+    return paths[0], details
@@ -4,58 +4,57 @@ import os
 import sys
 import random
 import base64
+import itertools
 from datetime import datetime
 from time import sleep
 
 from twitter import tweet_pic, answerMentions
-from graphs import RandomGraph, synonyms, layouts_all, styles_all
-from graphs import draw_graph, draw_graphtool, draw_blockmodel
-from graphs import RetryableError
-from graphs.visualize import GtLayout, NxLayout, GvLayout
+from graphs import RandomGraph, synonyms, layouts_all, styles_all, draw_vector
+from graphs.pipeline import PlotPipeline, draw_styles
+from graphs.animation import animate
+from graphs.visualize import compute_layout
+from graphs.blockmodel import fit_blockmodel
+from graphs.targets import archive_targets, render_size
+from graphs.surface_pool import surface_pool
+from graphs.metrics import instrument
+from graphs.nx2gt.nx2gt import nx2gt
 from parse import match
 
 absdir = os.path.abspath(os.path.dirname(__file__))
 
 
 def createPlot(graphGenerator, folder, seed,
-               comment="no comment", style=None, layout=None):
-    G, details = graphGenerator()
-
+               comment="no comment", style=None, layout=None, candidates=1,
+               targets=None):
     os.makedirs(folder, exist_ok=True)
     basename = "{:.0f}_{}".format(datetime.timestamp(datetime.now()),
                                   seed.replace("/", "-"))
     basename = os.path.join(folder, basename)
 
-    if style is None:
-        style = random.choice(details["allowed_styles"])
-
-    if layout is None:
-        layout = random.choice(details["allowed_layouts"])
+    pipeline = PlotPipeline(graphGenerator, basename, absdir, seed,
+                            style=style, layout=layout)
+    # without a given layout, try this many allowed layouts in parallel
+    pipeline.candidates = candidates
+    if targets is not None:
+        pipeline.targets = targets
 
-    # TODO I need to make this pretty
-    try:
-        if (layout in GtLayout().layouts
-                or layout == "explicit"
-                or layout in GvLayout().layouts
-                or layout in NxLayout().layouts):
-            path, style_detail = draw_graphtool(G, basename, absdir, style, layout)
-        elif layout == "Blockmodel":
-            path, style_detail = draw_blockmodel(G, basename, absdir, "None", layout)
-        else:
-            raise
     # sometimes errors will be thrown because a particular instance can not
-    # be drawn with some mehtod, in this case, try again
-    except RetryableError:
-        print("try again")
-        path, details = createPlot(graphGenerator, folder, "1"+seed, comment, style, layout)
+    # be drawn with some mehtod, in this case the pipeline retries the
+    # responsible stage
+    try:
+        path, style_detail = pipeline.run()
     except:
         from traceback import print_exc
         print("unexpected error:", sys.exc_info())
-        print(layout, style)
-        print(details)
+        print(pipeline.layout, pipeline.style)
+        print(pipeline.details)
         print_exc()
         exit(1)
 
+    details = pipeline.details
+    # the final image, such that it can be uploaded without reading the file
+    details["png"] = pipeline.png
+
     with open(basename + ".txt", "w") as f:
         f.write(details["seed"])
         f.write("\n")
@@ -65,6 +64,12 @@ def createPlot(graphGenerator, folder, seed,
         f.write("\n")
         f.write(str(style_detail))
         f.write("\n")
+        for stage, subseed in pipeline.retries:
+            f.write("retry from {} with seed {}\n".format(stage, subseed))
+        if pipeline.winner is not None:
+            f.write("candidate {} of {} won with seed {}\n"
+                    .format(pipeline.winner[0], ", ".join(pipeline.tried),
+                            pipeline.winner[1]))
 
     return path, details
 
@@ -108,9 +113,11 @@ def guess_graph(text=None, handle=""):
     path, details = createPlot(gen, folder, seed,
                                comment="'{text}' -> {key} ({certainty}%)",
                                style=style,
-                               layout=layout)
+                               layout=layout,
+                               candidates=3)
 
     print(key, "({}%)".format(certainty))
+    print(surface_pool.report())
 
     print(details["template"].format(**details))
 
@@ -126,11 +133,165 @@ def guess_graph(text=None, handle=""):
         answer = "{handle} here is a picture of the {graph} you're interested in! ({N} nodes)"
     answer = answer.format(handle=handle, graph=name, N=details["N"]).strip()
 
-    return path, answer
+    return path, answer, details
+
+
+def bake():
+    """Precompute the layouts of all networks in graphs/networks/.
+
+    The positions are stored in the layout cache and the blockmodels in the
+    blockmodel cache, such that drawing one of the real world networks later
+    only needs to render.
+    """
+    GraphGenerator = RandomGraph("bake")
+    generators = [GraphGenerator.generateRealWorld,
+                  GraphGenerator.generateScience,
+                  GraphGenerator.generateFromEdgelist]
+
+    skipped = []
+    for generator in generators:
+        for idx in itertools.count():
+            try:
+                G, details = generator(idx)
+            except IndexError:
+                break
+            except OSError as e:
+                # not every network listed is in the repository
+                print("skip {} {}: {}".format(generator.__name__, idx, e))
+                skipped.append("{} {}".format(generator.__name__, idx))
+                continue
+            g = nx2gt(G)
+            for layout in details["allowed_layouts"]:
+                start = datetime.now()
+                if layout == "Blockmodel":
+                    fit_blockmodel(G, g)
+                else:
+                    compute_layout(G, g, layout)
+                print("baked {} ({} nodes) with {} in {}".format(
+                    details["name"], details["N"], layout, datetime.now() - start))
+
+    if skipped:
+        print("skipped missing networks:", ", ".join(skipped))
+
+
+def gallery(seed):
+    """Draw one random graph in all styles it allows, from the same layout."""
+    GraphGenerator = RandomGraph(seed)
+    G, details = GraphGenerator.randomGraph()
+    layout = random.choice([l for l in details["allowed_layouts"]
+                            if l != "Blockmodel"])
+
+    folder = os.path.join(absdir, "gallery")
+    os.makedirs(folder, exist_ok=True)
+    basename = "{:.0f}_{}".format(datetime.timestamp(datetime.now()),
+                                  seed.replace("/", "-"))
+    basename = os.path.join(folder, basename)
+
+    paths = draw_styles(G, basename, layout, details["allowed_styles"])
+
+    with open(basename + ".txt", "w") as f:
+        f.write(details["seed"])
+        f.write("\n")
+        f.write(details["template"].format(**details))
+        f.write("\n")
+        f.write("layout = {}".format(layout))
+        f.write("\n")
+
+    for style, path in paths.items():
+        print(style, path)
+
+
+def animation(seed, fmt="webp"):
+    """Draw the growth of a random growing graph as an animation."""
+    GraphGenerator = RandomGraph(seed)
+    generator = random.choice([GraphGenerator.generateBarabasiAlbert,
+                               GraphGenerator.generateDuplicationDivergence,
+                               GraphGenerator.generateDorogovtsevGoltsevMendes])
+    G, details = generator()
+    style = random.choice(details["allowed_styles"])
+
+    folder = os.path.join(absdir, "animations")
+    os.makedirs(folder, exist_ok=True)
+    basename = "{:.0f}_{}".format(datetime.timestamp(datetime.now()),
+                                  seed.replace("/", "-"))
+    basename = os.path.join(folder, basename)
+
+    path = animate(G, basename, style, fmt=fmt, seed=seed)
+
+    with open(basename + ".txt", "w") as f:
+        f.write(details["seed"])
+        f.write("\n")
+        f.write(details["template"].format(**details))
+        f.write("\n")
+        f.write("style = {}".format(style))
+        f.write("\n")
+
+    print(path)
+
+
+def vector(seed, fmt="svg"):
+    """Draw a random graph as svg or pdf for print."""
+    GraphGenerator = RandomGraph(seed)
+    G, details = GraphGenerator.randomGraph()
+    layout = random.choice([l for l in details["allowed_layouts"]
+                            if l != "Blockmodel"])
+    style = random.choice(details["allowed_styles"])
+
+    folder = os.path.join(absdir, "print")
+    os.makedirs(folder, exist_ok=True)
+    basename = "{:.0f}_{}".format(datetime.timestamp(datetime.now()),
+                                  seed.replace("/", "-"))
+    basename = os.path.join(folder, basename)
+
+    path, info = draw_vector(G, basename, absdir, style, layout, fmt=fmt)
+
+    with open(basename + ".txt", "w") as f:
+        f.write(details["seed"])
+        f.write("\n")
+        f.write(details["template"].format(**details))
+        f.write("\n")
+        f.write(info)
+        f.write("\n")
+
+    print(path)
 
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "bake":
+        bake()
+        sys.exit()
+
+    if len(sys.argv) > 1 and sys.argv[1] == "gallery":
+        if len(sys.argv) > 2:
+            seed = sys.argv[2]
+        else:
+            seed = base64.b64encode(os.urandom(8)).decode("ascii")
+        gallery(seed)
+        sys.exit()
+
+    if len(sys.argv) > 1 and sys.argv[1] == "animate":
+        if len(sys.argv) > 2:
+            seed = sys.argv[2]
+        else:
+            seed = base64.b64encode(os.urandom(8)).decode("ascii")
+        animation(seed, fmt="gif" if "gif" in sys.argv[3:] else "webp")
+        sys.exit()
+
+    if len(sys.argv) > 1 and sys.argv[1] == "print":
+        if len(sys.argv) > 2:
+            seed = sys.argv[2]
+        else:
+            seed = base64.b64encode(os.urandom(8)).decode("ascii")
+        vector(seed, fmt="pdf" if "pdf" in sys.argv[3:] else "svg")
+        sys.exit()
+
     if len(sys.argv) > 1 and "mentions" in sys.argv:
+        # we are running for a long time, use the idle time to improve the
+        # cached blockmodels
+        PlotPipeline.blockmodel_refine = 300
+        # every answer renders a canvas and the blockmodel composes on a
+        # second one, keep them allocated instead of fragmenting the heap
+        surface_pool.preallocate(*[render_size(PlotPipeline.targets)] * 2)
         while True:
             try:
                 answerMentions(guess_graph)
@@ -148,14 +309,19 @@ if __name__ == "__main__":
 
     if "test" not in sys.argv:
         folder = os.path.join(absdir, "archive")
+        # the daily graph is kept at full resolution and with a preview
+        targets = archive_targets
     else:
         folder = os.path.join(absdir, "test")
+        targets = None
 
     GraphGenerator = RandomGraph(seed)
 
-    path, details = createPlot(GraphGenerator.randomGraph, folder, seed)
+    path, details = createPlot(GraphGenerator.randomGraph, folder, seed,
+                               targets=targets)
 
     text = "{name} ({N} nodes)".format(**details)
 
     if "test" not in sys.argv:
-        tweet_pic(path, text)
+        with instrument("upload", lambda: dict(generator=details["name"], N=details["N"])):
+            tweet_pic(path, text, data=details["png"])
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+
+"""Scaling of the functions which used to hide quadratic loops.
+
+    python3 microbenchmark.py [--only name] [--quick] [--out micro.json]
+
+Every case is timed (best of `repeat` runs) at several sizes N, and the
+exponent of t ~ N^k is fitted on a log-log scale. A case fails if its
+exponent exceeds max_exponent or its time at the largest size exceeds
+max_seconds, then the exit status is 1. Works offline like benchmark.py.
+"""
+
+import sys
+import json
+import time
+import random
+import argparse
+from collections import namedtuple
+
+import numpy as np
+import networkx as nx
+
+from graphs import proximity_graphs, forcelayout
+from graphs.nx2gt.nx2gt import nx2gt
+from graphs.visualize import GtStyle, Centralities, positions_to_gt
+
+# setup(N) prepares the input and returns the function to time
+Case = namedtuple("Case", ["setup", "sizes", "max_exponent", "max_seconds"])
+
+repeat = 3
+
+
+def _proximity(generator):
+    def setup(N):
+        random.seed(N)
+        return lambda: generator(N)
+    return setup
+
+
+def _graph(N):
+    G = nx.gnm_random_graph(N, 3 * N, seed=N)
+    g = nx2gt(G)
+    pos = positions_to_gt(g, np.random.RandomState(N).random_sample((N, 2)) * 1000)
+    return G, g, pos
+
+
+def _nx2gt(N):
+    G, _, _ = _graph(N)
+    return lambda: nx2gt(G)
+
+
+def _mean_distance(N):
+    _, g, pos = _graph(N)
+    return lambda: GtStyle.mean_distance_from_gt_pos(g, pos)
+
+
+def _repulsion(N):
+    # clusters around a few hubs and far outliers, which stretch the root
+    # cell of the quadtree, like the layouts of scale-free graphs
+    rng = np.random.RandomState(N)
+    positions = rng.normal(0, 1, (N, 2)) * np.sqrt(N)
+    hubs = rng.choice(N, N // 100, replace=False)
+    positions[N // 2:] = positions[rng.choice(hubs, N - N // 2)] + rng.normal(0, 1, (N - N // 2, 2))
+    positions[:N // 1000 + 1] *= 100
+    mass = np.ones(N)
+    return lambda: forcelayout._repulsion(positions, mass)
+
+
+def _style(name, centrality):
+    def setup(N):
+        _, g, pos = _graph(N)
+        centralities = Centralities(g)
+        # the centralities are cached, only the style itself is timed
+        getattr(centralities, centrality)
+        style = GtStyle().names[name]
+        return lambda: style(g, pos, outsize=(2048, 1024), node_size=10.,
+                             centralities=centralities)
+    return setup
+
+
+proximity_sizes = [250, 500, 1000, 2000, 4000]
+graph_sizes = [2000, 4000, 8000, 16000, 32000]
+
+cases = {
+    "proximity_graphs.rng": Case(_proximity(proximity_graphs.relative_neighborhood_graph),
+                                 proximity_sizes, 1.4, 2.),
+    "proximity_graphs.gg": Case(_proximity(proximity_graphs.gabriel_graph),
+                                proximity_sizes, 1.4, 2.),
+    "proximity_graphs.mr": Case(_proximity(proximity_graphs.minimum_radius),
+                                proximity_sizes, 1.4, 2.),
+    "forcelayout._repulsion": Case(_repulsion, graph_sizes, 1.3, 4.),
+    "nx2gt": Case(_nx2gt, graph_sizes, 1.3, 5.),
+    "GtStyle.mean_distance_from_gt_pos": Case(_mean_distance, graph_sizes, 1.3, 1.),
+    "GtStyle.styleCurved": Case(_style("Curved", "hits"), graph_sizes, 1.3, 1.),
+    "GtStyle.styleBlocky": Case(_style("Blocky", "eigenvector"), graph_sizes, 1.3, 1.),
+}
+
+
+def measure(case, sizes):
+    """Best time of repeat runs for every size."""
+    times = []
+    for N in sizes:
+        f = case.setup(N)
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            f()
+            best = min(best, time.perf_counter() - start)
+        times.append(best)
+    return times
+
+
+def scaling_exponent(sizes, times):
+    """Slope of log(t) over log(N), fitted by least squares."""
+    return np.polyfit(np.log(sizes), np.log(np.maximum(times, 1e-9)), 1)[0]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--only", action="append", help="run only this case")
+    parser.add_argument("--quick", action="store_true", help="skip the largest size")
+    parser.add_argument("--out", help="write the measurements as json")
+    args = parser.parse_args()
+
+    results = {}
+    failures = []
+    for name, case in cases.items():
+        if args.only and name not in args.only:
+            continue
+        sizes = case.sizes[:-1] if args.quick else case.sizes
+        times = measure(case, sizes)
+        k = scaling_exponent(sizes, times)
+        ok = k <= case.max_exponent and times[-1] <= case.max_seconds
+        results[name] = dict(sizes=sizes, times=times, exponent=k, ok=ok)
+        print("{:40s} k = {:.2f} (max {:.1f}), {:.3f} s at N = {} (max {:.1f} s) {}"
+              .format(name, k, case.max_exponent, times[-1], sizes[-1],
+                      case.max_seconds, "ok" if ok else "FAILED"))
+        if not ok:
+            failures.append(name)
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=1)
+
+    if failures:
+        print("scaling regressed:", ", ".join(failures))
+        sys.exit(1)
@@ -0,0 +1,41 @@
+import numpy as np
+import networkx as nx
+import pytest
+
+pytest.importorskip("graph_tool")
+
+from graphs.nx2gt.nx2gt import nx2gt
+from graphs.animation import growth_sizes, prefix_graph, place_new_nodes, growth_layouts
+
+
+def test_growth_sizes_grow_up_to_the_graph():
+    sizes = growth_sizes(1000, 48)
+    assert sizes[0] == 3 and sizes[-1] == 1000
+    assert all(a < b for a, b in zip(sizes, sizes[1:]))
+    # small graphs have fewer distinct frames
+    assert growth_sizes(5, 48) == [3, 4, 5]
+    assert growth_sizes(2, 10) == [2]
+
+
+def test_new_nodes_are_placed_next_to_their_neighbors():
+    g = nx2gt(nx.path_graph(6))
+    positions = np.array([[0., 0], [1, 0], [2, 0], [3, 0]])
+    placed = place_new_nodes(g, positions, 4)
+    np.testing.assert_array_equal(placed[:4], positions)
+    # the mean edge length is 1, new nodes are half of it away
+    assert np.linalg.norm(placed[4] - positions[3]) == pytest.approx(0.5)
+    assert np.linalg.norm(placed[5] - placed[4]) == pytest.approx(0.5)
+
+
+def test_frames_are_prefixes_and_warm_started():
+    g = nx2gt(nx.barabasi_albert_graph(200, 2, seed=1))
+    sizes = growth_sizes(200, 6)
+    graphs, layouts = growth_layouts(g, sizes)
+    assert [gn.num_vertices() for gn in graphs] == sizes
+    assert [len(p) for p in layouts] == sizes
+    assert graphs[-1].num_edges() == g.num_edges()
+    assert prefix_graph(g, 10).num_vertices() == 10
+    # the old nodes stay in place on average
+    for previous, positions in zip(layouts, layouts[1:]):
+        m = len(previous)
+        np.testing.assert_allclose(positions[:m].mean(axis=0), previous.mean(axis=0))
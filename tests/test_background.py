@@ -0,0 +1,72 @@
+import time
+import threading
+
+from tests import graphs_module
+
+background = graphs_module("background")
+
+
+def idle(queue):
+    """Wait until the done callbacks of the joined jobs ran, too."""
+    queue.join()
+    while queue.pending():
+        time.sleep(0.001)
+
+
+def test_jobs_run_and_are_joined():
+    queue = background.BackgroundQueue(workers=2)
+    done = []
+    for i in range(5):
+        queue.submit(lambda i=i: done.append(i))
+    idle(queue)
+    assert sorted(done) == list(range(5))
+    assert queue.pending() == 0
+
+
+def test_failing_job_does_not_stop_the_queue(capsys):
+    queue = background.BackgroundQueue(workers=1)
+    queue.submit(lambda: 1 / 0)
+    future = queue.submit(lambda: "ok")
+    queue.join()
+    assert future.result() == "ok"
+    assert "background job failed" in capsys.readouterr().err
+
+
+def test_unique_jobs_are_dropped_while_queued():
+    queue = background.BackgroundQueue(workers=1, max_pending=2)
+    release = threading.Event()
+    first = queue.submit_unique("a", release.wait)
+    assert queue.submit_unique("a", release.wait) is None
+    second = queue.submit_unique("b", release.wait)
+    # max_pending unfinished jobs
+    assert queue.submit_unique("c", release.wait) is None
+    release.set()
+    idle(queue)
+    assert first.result() and second.result()
+    # finished jobs can be submitted again
+    assert queue.submit_unique("a", lambda: 1).result() == 1
+
+
+def test_paused_queue_waits_at_checkpoints():
+    queue = background.BackgroundQueue(workers=1)
+    steps = []
+
+    def job():
+        for i in range(20):
+            queue.checkpoint()
+            steps.append(i)
+            time.sleep(0.005)
+
+    queue.submit(job)
+    while not steps:
+        time.sleep(0.001)
+    with queue.paused():
+        paused_at = len(steps)
+        time.sleep(0.05)
+        assert len(steps) == paused_at
+        # jobs submitted while paused wait as well
+        late = queue.submit(lambda: steps.append("late"))
+        time.sleep(0.02)
+        assert not late.done()
+    queue.join()
+    assert steps[:20] == list(range(20)) and steps[-1] == "late"
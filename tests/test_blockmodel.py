@@ -0,0 +1,55 @@
+import numpy as np
+import networkx as nx
+import pytest
+
+from tests import graphs_module
+
+layout_cache = graphs_module("layout_cache")
+
+
+def test_blockmodel_round_trip(tmp_path):
+    cache = layout_cache.BlockmodelCache(str(tmp_path))
+    key = cache.key("fp", "Blockmodel")
+    bs = [np.array([0, 0, 1, 1, 2]), np.array([0, 1, 1]), np.array([0, 0])]
+    cache.put(key, (bs, 123.5, 4.))
+    cached_bs, entropy, spent = cache.get(key)
+    assert len(cached_bs) == 3
+    for a, b in zip(cached_bs, bs):
+        np.testing.assert_array_equal(a, b)
+    assert entropy == 123.5 and spent == 4.
+
+    cache.put(key, (bs, 120., np.inf))
+    assert cache.get(key)[2] == np.inf
+
+
+def test_entries_without_budget_are_provisional(tmp_path):
+    cache = layout_cache.BlockmodelCache(str(tmp_path))
+    key = cache.key("fp", "Blockmodel")
+    bs = [np.array([0, 1]), np.array([0, 0])]
+    with open(cache.path(key), "wb") as f:
+        np.savez(f, *bs, entropy=10.)
+    _, entropy, spent = cache.get(key)
+    assert entropy == 10. and spent == 0.
+
+
+def test_provisional_fit_is_refitted_with_a_larger_budget(tmp_path, monkeypatch):
+    pytest.importorskip("graph_tool")
+    blockmodel = graphs_module("blockmodel")
+    from graphs.nx2gt.nx2gt import nx2gt
+
+    monkeypatch.setattr(blockmodel.blockmodel_cache, "folder", str(tmp_path))
+    G = nx.planted_partition_graph(3, 20, 0.5, 0.02, seed=1)
+    g = nx2gt(G)
+    key = blockmodel.blockmodel_key(G)
+
+    blockmodel.fit_blockmodel(G, g, budget=0.5)
+    _, provisional, spent = blockmodel.blockmodel_cache.get(key)
+    assert spent == 0.5
+
+    # a smaller budget reuses the entry
+    blockmodel.fit_blockmodel(G, g, budget=0.2)
+    assert blockmodel.blockmodel_cache.get(key)[2] == 0.5
+
+    blockmodel.fit_blockmodel(G, g, budget=1.)
+    _, entropy, spent = blockmodel.blockmodel_cache.get(key)
+    assert spent == 1.5 and entropy <= provisional
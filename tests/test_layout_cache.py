@@ -0,0 +1,67 @@
+import os
+
+import numpy as np
+import networkx as nx
+
+from tests import graphs_module
+
+layout_cache = graphs_module("layout_cache")
+
+
+def test_positions_round_trip(tmp_path):
+    cache = layout_cache.LayoutCache(str(tmp_path))
+    key = cache.key("fp", "SFDP", K=2)
+    assert cache.get(key) is None
+    positions = np.random.RandomState(0).normal(size=(10, 2))
+    cache.put(key, positions)
+    np.testing.assert_array_equal(cache.get(key), positions)
+    # the parameters are part of the key
+    assert cache.key("fp", "SFDP", K=3) != key
+
+
+def test_broken_entries_are_discarded(tmp_path):
+    cache = layout_cache.LayoutCache(str(tmp_path))
+    key = cache.key("fp", "SFDP")
+    cache.put(key, np.zeros((10, 2)))
+    with open(cache.path(key), "r+b") as f:
+        f.truncate(20)
+    assert cache.get(key) is None
+    assert not os.path.exists(cache.path(key))
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = layout_cache.LayoutCache(str(tmp_path))
+    positions = np.zeros((100, 2))
+    keys = [cache.key(str(i), "SFDP") for i in range(3)]
+    for age, key in enumerate(keys):
+        cache.put(key, positions)
+        os.utime(cache.path(key), (age, age))
+    # using the oldest entry makes it the most recent one
+    cache.get(keys[0])
+    cache.max_bytes = 2.5 * os.path.getsize(cache.path(keys[0]))
+    cache.evict()
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) is not None and cache.get(keys[2]) is not None
+
+
+def test_fingerprint_ignores_the_order_of_the_edges():
+    G = nx.gnm_random_graph(30, 60, seed=1)
+    H = nx.Graph()
+    H.add_nodes_from(G.nodes())
+    H.add_edges_from((v, u) for u, v in reversed(list(G.edges())))
+    assert layout_cache.fingerprint(G) == layout_cache.fingerprint(H)
+
+    # but not of the nodes, the positions are stored by node index
+    shuffled = nx.Graph()
+    shuffled.add_nodes_from(reversed(list(G.nodes())))
+    shuffled.add_edges_from(G.edges())
+    assert layout_cache.fingerprint(shuffled) != layout_cache.fingerprint(G)
+    assert layout_cache.fingerprint(G.to_directed()) != layout_cache.fingerprint(G)
+
+
+def test_only_networks_and_large_graphs_are_cached():
+    G = nx.path_graph(10)
+    assert not layout_cache.worth_caching(G)
+    G.graph["network"] = "dolphins"
+    assert layout_cache.worth_caching(G)
+    assert layout_cache.worth_caching(nx.empty_graph(layout_cache.min_cached_nodes))
@@ -0,0 +1,87 @@
+import os
+import json
+
+import pytest
+
+from tests import graphs_module
+
+metrics = graphs_module("metrics")
+
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics.Metrics, "folder", str(tmp_path))
+    registry = metrics.Registry()
+    monkeypatch.setattr(metrics, "registry", registry)
+    return registry
+
+
+def events(tmp_path):
+    with open(tmp_path / metrics.Metrics.jsonl) as f:
+        return [json.loads(line) for line in f]
+
+
+def textfile(tmp_path):
+    with open(tmp_path / metrics.Metrics.textfile) as f:
+        return f.read()
+
+
+def test_stages_are_measured_with_labels(registry, tmp_path):
+    with metrics.instrument("layout", lambda: dict(generator="cycle", N=10)):
+        pass
+    with pytest.raises(ZeroDivisionError):
+        with metrics.instrument("layout"):
+            1 / 0
+
+    start, end, _, failed = events(tmp_path)
+    assert start["event"] == "start" and start["stage"] == "layout"
+    assert end["ok"] and end["generator"] == "cycle" and end["N"] == 10
+    assert end["wall"] >= 0 and end["peak_rss"] > 0
+    assert not failed["ok"]
+
+    assert registry.stages["layout"]["ok"] == 1
+    assert registry.stages["layout"]["failed"] == 1
+    text = textfile(tmp_path)
+    assert 'agraphaday_stage_runs_total{stage="layout",outcome="ok"} 1' in text
+    assert 'agraphaday_stage_runs_total{stage="layout",outcome="failed"} 1' in text
+    # nothing is running anymore
+    assert 'stage_running_since_seconds{' not in text
+
+
+def test_broken_labels_do_not_fail_the_stage(registry, tmp_path):
+    with metrics.instrument("style", lambda: dict(N=1 / 0)):
+        pass
+    end = events(tmp_path)[-1]
+    assert end["ok"] and "ZeroDivisionError" in end["labels_error"]
+
+
+def test_deferred_records_are_replayed(registry, tmp_path, monkeypatch):
+    # as in a forked candidate, whose parent records the measurements
+    deferred = metrics.defer()
+    with metrics.instrument("render", lambda: dict(candidate="SFDP")):
+        pass
+    assert not os.path.exists(tmp_path / metrics.Metrics.jsonl)
+
+    monkeypatch.setattr(metrics, "registry", registry)
+    metrics.record(deferred.records)
+    end, = events(tmp_path)
+    assert end["stage"] == "render" and end["candidate"] == "SFDP"
+    assert registry.stages["render"]["ok"] == 1
+
+
+def test_reply_latency_histogram(registry, tmp_path):
+    metrics.observe_reply_latency(45)
+    metrics.observe_reply_latency(7200)
+    text = textfile(tmp_path)
+    assert 'agraphaday_reply_latency_seconds_bucket{le="30"} 0' in text
+    assert 'agraphaday_reply_latency_seconds_bucket{le="60"} 1' in text
+    assert 'agraphaday_reply_latency_seconds_bucket{le="3600"} 1' in text
+    assert 'agraphaday_reply_latency_seconds_bucket{le="+Inf"} 2' in text
+    assert "agraphaday_reply_latency_seconds_count 2" in text
+
+
+def test_thread_split_is_recorded(registry, tmp_path):
+    metrics.observe_threads("render", 4, 2, 8)
+    event = events(tmp_path)[-1]
+    assert event["event"] == "threads" and event["processes"] == 4
+    assert 'agraphaday_stage_threads{stage="render",of="threads"} 2' in textfile(tmp_path)
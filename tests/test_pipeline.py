@@ -0,0 +1,162 @@
+import os
+import json
+
+import pytest
+import numpy as np
+import networkx as nx
+
+pytest.importorskip("graph_tool")
+
+from graphs.pipeline import PlotPipeline, reseed
+from graphs.layout_cache import layout_cache
+from graphs.spectral import spectral_layout
+from graphs.validate import check_drawable
+from graphs.visualize import RetryableError
+from graphs.targets import archive_targets, target_paths
+
+
+def tree(N=100):
+    """Barabási-Albert graph with m = 1, whose spectral layout collapses."""
+    def graphGenerator():
+        G = nx.barabasi_albert_graph(N, 1)
+        return G, dict(name="Barabási-Albert Graph", N=N, m=1,
+                       allowed_layouts=["Spectral", "SFDP", "FruchtermanReingold"],
+                       allowed_styles=["Degree"])
+    return graphGenerator
+
+
+def boring_first(N=100):
+    """Like tree(), but the first graph has almost only isolated nodes."""
+    calls = []
+
+    def graphGenerator():
+        calls.append(N)
+        G, details = tree(N)()
+        if len(calls) == 1:
+            G = nx.empty_graph(N)
+            G.add_edge(0, 1)
+        return G, details
+    graphGenerator.calls = calls
+    return graphGenerator
+
+
+@pytest.fixture
+def pipeline(tmp_path, monkeypatch):
+    monkeypatch.setattr(layout_cache, "folder", str(tmp_path / "layouts"))
+
+    def make(graphGenerator, seed="test", **kwargs):
+        reseed(seed)
+        p = PlotPipeline(graphGenerator, str(tmp_path / "out"), str(tmp_path), seed, **kwargs)
+        p.optimize = None
+        return p
+    return make
+
+
+def test_spectral_collapses_trees():
+    G = nx.barabasi_albert_graph(100, 1, seed=0)
+    edges = np.array(G.edges())
+    rejected = check_drawable(edges, spectral_layout(100, edges, seed=0))
+    assert rejected is not None and rejected[0] == "collapsed"
+    # the layout ignores the seed, laying out again does not help
+    assert check_drawable(edges, spectral_layout(100, edges, seed=1)) is not None
+
+
+def test_boring_graph_is_generated_again(pipeline):
+    generator = boring_first()
+    p = pipeline(generator, layout="SFDP")
+    path, _ = p.run()
+    assert p.retries == [("generate", "test/generate1")]
+    assert len(generator.calls) == 2
+    assert os.path.exists(path)
+
+
+def test_retries_are_reproducible(pipeline):
+    drawings = []
+    for _ in range(2):
+        p = pipeline(boring_first(), layout="SFDP")
+        path, _ = p.run()
+        with open(path, "rb") as f:
+            drawings.append((p.retries, f.read()))
+    assert drawings[0] == drawings[1]
+
+
+def test_retries_are_bounded(pipeline):
+    def graphGenerator():
+        return nx.empty_graph(10), dict(name="Empty Graph", N=10,
+                                        allowed_layouts=["SFDP"],
+                                        allowed_styles=["Degree"])
+    p = pipeline(graphGenerator)
+    with pytest.raises(RetryableError):
+        p.run()
+    assert len(p.retries) == p.max_retries
+    assert [subseed for _, subseed in p.retries] == [
+        "test/generate{}".format(i + 1) for i in range(p.max_retries)]
+
+
+def test_rejected_layout_is_replaced(pipeline):
+    p = pipeline(tree())
+    # as if Spectral was drawn at random
+    p.layout = "Spectral"
+    p.run()
+    assert p.rejected_layouts[0] == "Spectral"
+    assert p.layout_used != "Spectral"
+    assert p.retries[0][0] == "layout"
+
+
+def test_requested_layout_gets_another_graph(pipeline):
+    p = pipeline(tree(), layout="Spectral")
+    path, _ = p.run()
+    assert p.retries[0][0] == "generate"
+    # Spectral collapses almost every such tree, then another layout is used
+    # instead of giving up
+    assert os.path.exists(path)
+    if p.rejected_layouts.count("Spectral") > 1:
+        assert p.layout_used != "Spectral"
+
+
+def test_every_target_is_written(pipeline, tmp_path):
+    pytest.importorskip("PIL")
+    p = pipeline(tree(), layout="SFDP")
+    p.targets = archive_targets
+    path, _ = p.run()
+
+    paths = target_paths(str(tmp_path / "out"), archive_targets)
+    assert path == paths[0]
+    assert p.paths == paths
+
+    from PIL import Image
+    for target, path in zip(archive_targets, paths):
+        with Image.open(path) as image:
+            assert image.size == target.size
+            assert image.format.lower() == target.format
+
+
+def test_speculated_stages_are_measured_once(pipeline, tmp_path, monkeypatch):
+    from graphs import metrics
+    monkeypatch.setattr(metrics.Metrics, "folder", str(tmp_path / "metrics"))
+    monkeypatch.setattr(metrics, "registry", metrics.Registry())
+
+    p = pipeline(tree())
+    p.candidates = 3
+    p.run()
+    with open(tmp_path / "metrics" / metrics.Metrics.jsonl) as f:
+        ends = [json.loads(line) for line in f if '"end"' in line]
+    # only the candidates measure the layout, the parent does not wrap them
+    layouts = [e for e in ends if e["stage"] == "layout"]
+    assert layouts and all("candidate" in e for e in layouts)
+
+
+def test_every_style_is_drawn_from_one_layout(tmp_path, monkeypatch):
+    from graphs.pipeline import draw_styles
+    monkeypatch.setattr(layout_cache, "folder", str(tmp_path / "layouts"))
+    reseed("styles")
+    G = nx.barabasi_albert_graph(100, 2)
+    styles = ["Degree", "Betweenness", "Curved"]
+    paths = draw_styles(G, str(tmp_path / "graph"), "SFDP", styles, workers=2)
+    assert list(paths) == styles
+    drawings = []
+    for style in styles:
+        assert paths[style] == str(tmp_path / "graph_{}.png".format(style))
+        with open(paths[style], "rb") as f:
+            drawings.append(f.read())
+    assert len(set(drawings)) == len(styles)
@@ -0,0 +1,72 @@
+import random
+
+import pytest
+import networkx as nx
+
+pytest.importorskip("graph_tool")
+
+from graphs import proximity_graphs as pg
+
+
+# the former O(N^2) and O(N^3) implementations, which define the graphs
+
+def reference_rng(G):
+    G = pg.dt(G)
+    to_remove = set()
+    for c1, c2 in G.edges():
+        d = pg.dist(c1, c2)
+        for blocker in G.nodes():
+            if blocker in (c1, c2):
+                continue
+            if pg.dist(blocker, c1) < d and pg.dist(blocker, c2) < d:
+                to_remove.add((c1, c2))
+    G.remove_edges_from(to_remove)
+    return G
+
+
+def reference_gg(G):
+    G = pg.dt(G)
+    to_remove = set()
+    for c1, c2 in G.edges():
+        mid = ((c1[0] + c2[0]) / 2, (c1[1] + c2[1]) / 2)
+        r = pg.dist(c1, c2) / 2
+        for blocker in G.nodes():
+            if blocker in (c1, c2):
+                continue
+            if pg.dist(blocker, mid) <= r:
+                to_remove.add((c1, c2))
+    G.remove_edges_from(to_remove)
+    return G
+
+
+def reference_mr(G, r=None):
+    if r is None:
+        r = max(e[2]["weight"] for e in pg.mst(G.copy()).edges(data=True))
+    for c1 in G.nodes():
+        for c2 in G.nodes():
+            if c1 != c2 and pg.dist(c1, c2) <= r:
+                G.add_edge(c1, c2)
+    return G
+
+
+def edge_set(G):
+    return {frozenset(e) for e in G.edges()}
+
+
+@pytest.mark.parametrize("N", [50, 100, 300])
+@pytest.mark.parametrize("seed", [1, 100, 2021])
+@pytest.mark.parametrize("fast, reference", [(pg.rng, reference_rng),
+                                             (pg.gg, reference_gg),
+                                             (pg.mr, reference_mr)])
+def test_same_as_reference(fast, reference, N, seed):
+    random.seed(seed)
+    G = pg.random_points(N)
+    assert edge_set(fast(G.copy())) == edge_set(reference(G.copy()))
+
+
+def test_minimum_radius_is_connected():
+    # the longest edge of the spanning tree is exactly the radius, a kd-tree
+    # query for that radius lost it
+    random.seed(100)
+    G = pg.minimum_radius(100)
+    assert nx.is_connected(G)
@@ -0,0 +1,52 @@
+import pytest
+
+cairo = pytest.importorskip("cairo")
+
+from tests import graphs_module
+
+surface_pool = graphs_module("surface_pool")
+
+
+def test_released_surfaces_are_reused_cleared():
+    pool = surface_pool.SurfacePool()
+    a = pool.acquire((10, 10))
+    cr = cairo.Context(a)
+    cr.set_source_rgb(1, 0, 0)
+    cr.paint()
+    pool.release(a)
+
+    b = pool.acquire((10, 10))
+    assert b is a
+    b.flush()
+    assert not any(bytes(b.get_data()))
+    # other sizes are new surfaces
+    c = pool.acquire((20, 10))
+    assert c is not a and c.get_width() == 20
+
+    stats = pool.stats()
+    assert stats["allocated"] == 2 and stats["reused"] == 1
+    assert stats["in_use"] == 2 and stats["peak"] == 2
+
+
+def test_at_most_max_free_surfaces_are_kept():
+    pool = surface_pool.SurfacePool(max_free=1)
+    surfaces = [pool.acquire((10, 10)) for _ in range(3)]
+    for s in surfaces:
+        pool.release(s)
+    assert pool.stats()["free"] == 1 and pool.stats()["in_use"] == 0
+
+
+def test_foreign_surfaces_are_ignored():
+    pool = surface_pool.SurfacePool()
+    foreign = cairo.ImageSurface(cairo.FORMAT_ARGB32, 10, 10)
+    pool.release(foreign)
+    assert pool.stats()["free"] == 0
+    # and stay usable
+    cairo.Context(foreign).paint()
+
+
+def test_preallocated_surfaces_are_handed_out():
+    pool = surface_pool.SurfacePool()
+    pool.preallocate((30, 20))
+    pool.acquire((30, 20))
+    assert pool.stats()["allocated"] == 1 and pool.stats()["reused"] == 1
@@ -0,0 +1,63 @@
+import io
+
+import pytest
+
+cairo = pytest.importorskip("cairo")
+
+from tests import graphs_module
+
+targets = graphs_module("targets")
+composite = graphs_module("composite")
+Target = targets.Target
+
+
+def halves(w, h):
+    """Left half black, right half white."""
+    surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, w, h)
+    cr = cairo.Context(surface)
+    cr.set_source_rgb(0, 0, 0)
+    cr.paint()
+    cr.set_source_rgb(1, 1, 1)
+    cr.rectangle(w / 2, 0, w / 2, h)
+    cr.fill()
+    return surface
+
+
+def test_render_size_and_paths():
+    assert targets.render_size(targets.archive_targets) == (4096, 2048)
+    assert targets.target_paths("out/graph", targets.archive_targets) == [
+        "out/graph.png", "out/graph_4096x2048.png", "out/graph_512x256.webp"]
+
+
+def test_scale_fits_and_centers_on_the_background():
+    scaled = targets.scale(halves(400, 200), (100, 100))
+    try:
+        assert (scaled.get_width(), scaled.get_height()) == (100, 100)
+        pixels = composite.surface_array(scaled)
+        # the image is 100 x 50 in the middle, above it the background
+        assert pixels[10, 90] == 0xff000000
+        assert pixels[50, 90] == 0xffffffff
+        assert pixels[50, 10] == 0xff000000
+    finally:
+        targets.surface_pool.release(scaled)
+
+
+def test_png_is_encoded_losslessly():
+    surface = halves(40, 20)
+    data = targets.encode(surface, "png")
+    assert data.startswith(b"\x89PNG")
+    decoded = composite.surface_from_png(data)
+    assert bytes(decoded.get_data()) == bytes(surface.get_data())
+
+
+def test_every_target_is_encoded_at_its_size():
+    Image = pytest.importorskip("PIL.Image")
+    in_use = targets.surface_pool.stats()["in_use"]
+    wanted = [Target((400, 200)), Target((200, 100), "webp", 80), Target((100, 50), "jpeg")]
+    encoded = targets.encode_targets(halves(400, 200), wanted)
+    for data, target in zip(encoded, wanted):
+        image = Image.open(io.BytesIO(data))
+        assert image.size == target.size
+        assert image.format == target.format.upper()
+    # the scaled copies went back to the pool
+    assert targets.surface_pool.stats()["in_use"] == in_use
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("graph_tool")
+cairo = pytest.importorskip("cairo")
+
+from tests import graphs_module
+
+tiles = graphs_module("tiles")
+
+
+def test_tile_index_equals_brute_force():
+    rng = np.random.RandomState(3)
+    size, side = (1000, 700), 128
+    lo = rng.uniform(-100, 1100, size=(300, 2))
+    boxes = np.column_stack([lo, lo + rng.exponential(80, size=(300, 2))])
+    # nodes filtered out of the graph
+    boxes[::50] = np.nan
+
+    index = tiles.tile_index(boxes, size, side)
+    rects = tiles.tile_rects(size, side)
+    assert len(index) == len(rects)
+    for ids, (x, y, w, h) in zip(index, rects):
+        # the last column and row of tiles take the boxes up to the edge
+        expected = np.flatnonzero((boxes[:, 0] < x + side) & (boxes[:, 0] <= size[0])
+                                  & (boxes[:, 2] >= x)
+                                  & (boxes[:, 1] < y + side) & (boxes[:, 1] <= size[1])
+                                  & (boxes[:, 3] >= y))
+        np.testing.assert_array_equal(np.sort(ids), expected)
+
+
+def test_tiles_cover_the_image_once():
+    size = (300, 200)
+    covered = np.zeros(size[::-1], dtype=int)
+    for x, y, w, h in tiles.tile_rects(size, 128):
+        covered[y:y + h, x:x + w] += 1
+    assert (covered == 1).all()
+
+
+def test_tiled_rendering_equals_a_single_pass(monkeypatch):
+    import networkx as nx
+    import graph_tool.all as gt
+    from graphs.nx2gt.nx2gt import nx2gt
+
+    monkeypatch.setattr(tiles.Tiles, "side", 64)
+    monkeypatch.setattr(tiles.Tiles, "workers", 2)
+    g = nx2gt(nx.random_geometric_graph(100, 0.15, seed=2))
+    pos = g.new_vertex_property("vector<double>")
+    pos.set_2d_array(np.random.RandomState(2).uniform(10, 190, size=(2, 100)))
+    style = dict(output_size=(200, 150), bg_color=(1, 1, 1, 1), vertex_size=8)
+
+    single = cairo.ImageSurface(cairo.FORMAT_ARGB32, 200, 150)
+    cr = cairo.Context(single)
+    cr.set_source_rgba(1, 1, 1, 1)
+    cr.paint()
+    gt.cairo_draw(g, pos, cr, vertex_size=8)
+    single.flush()
+
+    tiled = cairo.ImageSurface(cairo.FORMAT_ARGB32, 200, 150)
+    tiles.render_tiled(g, pos, style, tiled)
+
+    a = np.frombuffer(bytes(single.get_data()), dtype=np.uint8).astype(int)
+    b = np.frombuffer(bytes(tiled.get_data()), dtype=np.uint8).astype(int)
+    # up to the antialiasing at the seams
+    assert np.mean(np.abs(a - b) > 8) < 0.02
@@ -0,0 +1,37 @@
+import numpy as np
+
+from tests import graphs_module
+
+validate = graphs_module("validate")
+
+cycle = np.array([(i, (i + 1) % 10) for i in range(10)])
+circle = np.column_stack([np.cos(np.arange(10)), np.sin(np.arange(10))])
+
+
+def rule(edges, positions):
+    problem = validate.check_drawable(edges, positions)
+    return problem and (problem[0], problem[2])
+
+
+def test_fine_drawing_passes():
+    assert validate.check_drawable(cycle, circle) is None
+    assert validate.check_drawable(cycle, None) is None
+
+
+def test_boring_graphs_are_generated_again():
+    assert rule(np.zeros((0, 2), dtype=int), None) == ("edges", "generate")
+    many = np.zeros((100, 2))
+    many[:10] = circle
+    assert rule([(0, 1)], many) == ("isolated", "generate")
+    line = np.column_stack([np.arange(10.), np.zeros(10)])
+    assert rule(cycle, line) == ("area", "generate")
+
+
+def test_broken_positions_are_laid_out_again():
+    broken = circle.copy()
+    broken[3] = np.nan
+    assert rule(cycle, broken) == ("finite", "layout")
+    assert rule(cycle, np.ones((10, 2))) == ("collapsed", "layout")
+    clumped = circle.copy()
+    clumped[:6] = clumped[0]
+    assert rule(cycle, clumped) == ("collapsed", "layout")
@@ -0,0 +1,71 @@
+import xml.etree.ElementTree as ET
+
+import numpy as np
+import pytest
+
+pytest.importorskip("cairo")
+
+from tests import graphs_module
+
+vector = graphs_module("vector")
+
+svg = "{http://www.w3.org/2000/svg}"
+red = (1, 0, 0, 0.5)
+blue = (0, 0, 1, 1)
+
+
+def test_svg_paths_have_explicit_opacity(tmp_path):
+    segments = np.array([[[0, 0], [10, 10]], [[10, 10], [20, 0]]], dtype=float)
+    centers = np.array([[0, 0], [10, 10], [20, 0]], dtype=float)
+    commands = [("edges", segments, red, 2.),
+                ("nodes", centers, np.full(3, 4.), "circle", blue, red, 1.)]
+    outfile = str(tmp_path / "graph.svg")
+    vector.write_svg(outfile, (30, 20), (1, 1, 1, 1), commands)
+
+    root = ET.parse(outfile).getroot()
+    assert root.get("width") == "30" and root.get("viewBox") == "0 0 30 20"
+    rect, edges, nodes = root
+    assert rect.tag == svg + "rect" and rect.get("fill") == "rgb(255,255,255)"
+
+    assert edges.get("fill") == "none"
+    assert edges.get("stroke") == "rgb(255,0,0)" and edges.get("stroke-opacity") == "0.500"
+    assert edges.get("stroke-width") == "2.000"
+    assert edges.get("d").count("M") == 2
+
+    assert nodes.get("fill") == "rgb(0,0,255)" and nodes.get("fill-opacity") == "1.000"
+    assert nodes.get("d").count("M") == 3
+
+
+def test_pdf_is_written(tmp_path):
+    centers = np.array([[5, 5]], dtype=float)
+    commands = [("nodes", centers, np.ones(1), "square", blue, red, 1.)]
+    outfile = str(tmp_path / "graph.pdf")
+    vector.write_pdf(outfile, (10, 10), (1, 1, 1, 1), iter(commands))
+    with open(outfile, "rb") as f:
+        assert f.read(5) == b"%PDF-"
+
+
+def test_primitives_merge_equal_styles_in_drawing_order():
+    gt = pytest.importorskip("graph_tool.all")
+    g = gt.Graph(directed=False)
+    g.add_vertex(4)
+    g.add_edge_list([(0, 1), (1, 2), (2, 3)])
+    pos = g.new_vertex_property("vector<double>")
+    pos.set_2d_array(np.array([[0., 1, 2, 3], [0, 0, 0, 0]]))
+
+    commands = list(vector.primitives(g, pos, {}))
+    assert [c[0] for c in commands] == ["edges", "nodes"]
+    assert commands[0][1].shape == (3, 2, 2)
+    assert len(commands[1][1]) == 4
+
+    color = g.new_edge_property("vector<double>")
+    for e, c in zip(g.edges(), [red, red, blue]):
+        color[e] = c
+    vorder = g.new_vertex_property("double")
+    vorder.a = [3, 2, 1, 0]
+    commands = list(vector.primitives(g, pos, dict(edge_color=color, vorder=vorder)))
+    edges = [c for c in commands if c[0] == "edges"]
+    assert [len(c[1]) for c in edges] == [2, 1]
+    assert [c[2] for c in edges] == [red, blue]
+    nodes, = [c for c in commands if c[0] == "nodes"]
+    np.testing.assert_array_equal(nodes[1][:, 0], [3, 2, 1, 0])
@@ -0,0 +1,51 @@
+import pytest
+import numpy as np
+import networkx as nx
+
+gt = pytest.importorskip("graph_tool.all")
+
+from graphs.nx2gt.nx2gt import nx2gt
+from graphs.visualize import approximate_betweenness, graphviz_positions
+
+
+@pytest.mark.parametrize("directed", [False, True])
+def test_approximate_betweenness_with_all_pivots_is_exact(directed):
+    G = nx.gnm_random_graph(60, 150, seed=1, directed=directed)
+    g = nx2gt(G)
+    vexact, eexact = gt.betweenness(g)
+    vbet, ebet, pivots, error = approximate_betweenness(g, budget=1, pivots=g.num_vertices())
+    assert pivots == g.num_vertices() and error == 0
+    np.testing.assert_allclose(vbet.a, vexact.a, atol=1e-12)
+    np.testing.assert_allclose(ebet.a, eexact.a, atol=1e-12)
+
+
+def test_graphviz_positions_in_forked_worker():
+    pytest.importorskip("pygraphviz")
+    G = nx.balanced_tree(2, 4)
+    direct = graphviz_positions(G, "dot")
+    forked = graphviz_positions(G, "dot", timeout=60)
+    assert forked.shape == (G.number_of_nodes(), 2)
+    np.testing.assert_allclose(forked, direct)
+
+
+def test_level_of_detail_keeps_large_graphs_within_budget(monkeypatch):
+    from graphs.visualize import LevelOfDetail, level_of_detail
+    monkeypatch.setattr(LevelOfDetail, "nodes", 100)
+    monkeypatch.setattr(LevelOfDetail, "edges", 200)
+    monkeypatch.setattr(LevelOfDetail, "primitives", 300)
+    g = nx2gt(nx.barabasi_albert_graph(500, 3, seed=1))
+    size = g.new_vertex_property("double")
+    size.a = np.linspace(0.5, 10, g.num_vertices())
+
+    view = level_of_detail(g, dict(vertex_size=size))
+    assert view.num_vertices() + view.num_edges() <= LevelOfDetail.primitives
+    assert view.num_vertices() <= LevelOfDetail.primitives // 2
+    # the largest nodes are kept, those smaller than a pixel are dropped
+    kept = view.get_vertices()
+    assert g.num_vertices() - 1 in kept
+    assert (size.a[kept] >= LevelOfDetail.min_node_size).all()
+    # edges are only drawn between kept nodes
+    assert np.isin(view.get_edges()[:, :2], kept).all()
+
+    small = nx2gt(nx.path_graph(50))
+    assert level_of_detail(small, {}) is small
@@ -11,7 +11,7 @@ except:
     from traceback import print_exc
     print_exc()
 
-    def tweet_pic(*args):
+    def tweet_pic(*args, **kwargs):
         print("Twitter package is broken")
     def get_my_handle(*args):
         print("Twitter package is broken")
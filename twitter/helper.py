@@ -1,3 +1,4 @@
+import io
 from functools import lru_cache
 
 import tweepy
@@ -15,8 +16,12 @@ auth.set_access_token(keys_and_secrets["access_token_key"],
 api = tweepy.API(auth, wait_on_rate_limit=True)
 
 
-def tweet_pic(path, text=None, reply_to=None):
-    api.update_status_with_media(status=text, filename=path, in_reply_to_status_id=reply_to)
+def tweet_pic(path, text=None, reply_to=None, data=None):
+    """Tweet the image at path, if data is given, it is uploaded from memory
+    and path is only used as the file name"""
+    file = io.BytesIO(data) if data is not None else None
+    api.update_status_with_media(status=text, filename=path, file=file,
+                                 in_reply_to_status_id=reply_to)
 
 
 def obtain_dm():
@@ -37,7 +42,8 @@ def obtain_dm():
             continue
         print("@" + i.user.screen_name, ":", i.text)
         last_id = max(i.id, last_id)
-        todo.append(dict(handle=i.user.screen_name, text=i.text, id=i.id))
+        todo.append(dict(handle=i.user.screen_name, text=i.text, id=i.id,
+                         created=i.created_at))
 
     with open("last_id.dat", "w") as f:
         f.write(str(last_id))
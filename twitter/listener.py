@@ -1,7 +1,10 @@
 import sys
+import time
 
 import tweepy
 
+from graphs.metrics import instrument, observe_reply_latency
+
 from .helper import api, tweet_pic, obtain_dm, get_my_handle
 
 my_handle = get_my_handle()
@@ -31,9 +34,11 @@ class MyStreamListener(tweepy.Stream):
         if mentioned:
             print(status.text)
             text = status.text.replace(my_handle, "")
-            path, answer = self.guess_graph(text=text,
-                                            handle=status.user.screen_name)
-            tweet_pic(path, answer, status.id)
+            path, answer, details = self.guess_graph(text=text,
+                                                     handle=status.user.screen_name)
+            with instrument("upload", lambda: dict(generator=details["name"], N=details["N"])):
+                tweet_pic(path, answer, status.id, data=details["png"])
+            observe_reply_latency(time.time() - status.created_at.timestamp())
 
             self.last_id = status.id
             with open("last_id.dat", "w") as f:
@@ -50,7 +55,8 @@ def answerMentions(guess_graph):
     """Answers mentions with images of graphs.
 
     guess_graph -- a function taking a string, parses it and returns the path
-                   to an image and and answer text
+                   to an image, an answer text and the details of the graph,
+                   whose "png" is the content of the image
     """
     try:
         # are there new mentions while we were not listening?
@@ -58,8 +64,10 @@ def answerMentions(guess_graph):
         print(len(todo), "new messages")
         for d in todo:
             text = d["text"].replace(my_handle, "")
-            path, answer = guess_graph(text=text, handle=d["handle"])
-            tweet_pic(path, answer, d["id"])
+            path, answer, details = guess_graph(text=text, handle=d["handle"])
+            with instrument("upload", lambda: dict(generator=details["name"], N=details["N"])):
+                tweet_pic(path, answer, d["id"], data=details["png"])
+            observe_reply_latency(time.time() - d["created"].timestamp())
     except:
         print("something went wrong", sys.exc_info())
 